@@ -0,0 +1,61 @@
+import argparse
+import json
+import os
+import time
+
+from sauber.utils import available_hash_algorithms, new_hasher
+
+parser = argparse.ArgumentParser(
+    description="Measure the hashing throughput of every available algorithm"
+)
+
+
+def parse_arguments():
+    parser.add_argument(
+        "--size",
+        help="Megabytes hashed per algorithm (default: 256)",
+        type=int,
+        default=256,
+    )
+    parser.add_argument(
+        "--chunk-size",
+        help="Bytes per update call (default: 1048576)",
+        type=int,
+        default=1024 * 1024,
+    )
+    parser.add_argument("--json", help="Print results as JSON", action="store_true")
+    return parser.parse_args()
+
+
+def measure_throughput(algorithm, chunk, number_of_chunks):
+    hasher = new_hasher(algorithm)
+
+    start = time.perf_counter()
+    for _ in range(number_of_chunks):
+        hasher.update(chunk)
+    hasher.digest()
+    elapsed = time.perf_counter() - start
+
+    return len(chunk) * number_of_chunks / elapsed / 1024**2
+
+
+def main():
+    args = parse_arguments()
+    chunk = os.urandom(args.chunk_size)
+    number_of_chunks = max(args.size * 1024**2 // args.chunk_size, 1)
+
+    results = {
+        algorithm: measure_throughput(algorithm, chunk, number_of_chunks)
+        for algorithm in available_hash_algorithms()
+    }
+
+    if args.json:
+        print(json.dumps({"throughput_mb_per_s": results}, indent=2))
+        return
+
+    for algorithm, throughput in sorted(results.items(), key=lambda item: -item[1]):
+        print(f"{algorithm:>10}  {throughput:10.1f} MB/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import argparse
+import functools
+import json
+import os
+import tempfile
+import time
+
+from sauber.settings import BUFFER_SIZE, HASH_ALGORITHM
+from sauber.utils import available_hash_algorithms, hash_file_full, new_hasher
+
+parser = argparse.ArgumentParser(
+    description="Compare the ways of reading files for full hashes"
+)
+
+
+def parse_arguments():
+    parser.add_argument(
+        "--size",
+        help="Megabytes of the hashed test file (default: 512)",
+        type=int,
+        default=512,
+    )
+    parser.add_argument(
+        "--buffer-size",
+        help=f"Bytes read at once (default: {BUFFER_SIZE})",
+        type=int,
+        default=BUFFER_SIZE,
+    )
+    parser.add_argument(
+        "--hash-algo",
+        help=f"Hash algorithm, a fast one shows the reading costs best "
+        f"(default: {HASH_ALGORITHM})",
+        choices=available_hash_algorithms(),
+        default=HASH_ALGORITHM,
+    )
+    parser.add_argument(
+        "--repeat", help="Runs per method (default: 3)", type=int, default=3
+    )
+    parser.add_argument("--json", help="Print results as JSON", action="store_true")
+    return parser.parse_args()
+
+
+def hash_file_read(file_path, buffer_size, algorithm):
+    # Allocates a new bytes object for every chunk, like earlier versions of sauber
+    hasher = new_hasher(algorithm)
+    with open(file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(buffer_size), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def hash_file_readinto(file_path, buffer_size, algorithm):
+    # The page cache is kept, so that all methods read from memory
+    return hash_file_full(
+        file_path, buffer_size, algorithm, mmap_threshold=None, drop_cache=False
+    )
+
+
+def hash_file_mmap(file_path, buffer_size, algorithm):
+    return hash_file_full(
+        file_path, buffer_size, algorithm, mmap_threshold=1, drop_cache=False
+    )
+
+
+def best_throughput(method, file_path, repeat):
+    # Warm up the page cache and the read buffer
+    method(file_path)
+
+    elapsed = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        method(file_path)
+        elapsed.append(time.perf_counter() - start)
+
+    return os.path.getsize(file_path) / min(elapsed) / 1024**2
+
+
+def main():
+    args = parse_arguments()
+    methods = {
+        "read": hash_file_read,
+        "readinto": hash_file_readinto,
+        "mmap": hash_file_mmap,
+    }
+
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "data")
+        with open(file_path, "wb") as file:
+            for _ in range(args.size):
+                file.write(os.urandom(1024**2))
+
+        results = {
+            name: best_throughput(
+                functools.partial(
+                    method, buffer_size=args.buffer_size, algorithm=args.hash_algo
+                ),
+                file_path,
+                args.repeat,
+            )
+            for name, method in methods.items()
+        }
+
+    if args.json:
+        print(json.dumps({"throughput_mb_per_s": results}, indent=2))
+        return
+
+    for name, throughput in results.items():
+        print(f"{name:>10}  {throughput:10.1f} MB/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import argparse
+import json
+import subprocess
+import sys
+
+parser = argparse.ArgumentParser(
+    description="Measure the import time of the sauber command line interface"
+)
+
+
+def parse_arguments():
+    parser.add_argument(
+        "--repeat", help="Runs of every command (default: 5)", type=int, default=5
+    )
+    parser.add_argument(
+        "--top",
+        help="Number of slowest modules shown (default: 10)",
+        type=int,
+        default=10,
+    )
+    parser.add_argument("--json", help="Print results as JSON", action="store_true")
+    return parser.parse_args()
+
+
+def import_times(arguments):
+    # -X importtime writes one line per module with its cumulative microseconds
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "sauber", *arguments],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+
+    times = {}
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line[len("import time:") :].split("|")
+        times[module.strip()] = int(cumulative)
+
+        # Nested imports are indented, top level ones add up to the total
+        if not module[1:].startswith(" "):
+            total += int(cumulative)
+
+    return total, times
+
+
+def measure(arguments, repeat):
+    total, times = min(
+        (import_times(arguments) for _ in range(repeat)), key=lambda run: run[0]
+    )
+    return {
+        "total_us": total,
+        "pandas_imported": "pandas" in times,
+        "modules_us": times,
+    }
+
+
+def main():
+    args = parse_arguments()
+    commands = {"help": ["--help"], "invalid": ["--unknown-argument"]}
+
+    results = {
+        name: measure(arguments, args.repeat) for name, arguments in commands.items()
+    }
+
+    if args.json:
+        print(json.dumps({"imports": results}, indent=2))
+        return
+
+    for name, result in results.items():
+        print(
+            f"{name:>10}  {result['total_us'] / 1000:8.1f} ms  "
+            f"pandas imported: {result['pandas_imported']}"
+        )
+        slowest = sorted(result["modules_us"].items(), key=lambda item: -item[1])
+        for module, time in slowest[: args.top]:
+            print(f"{'':>12}{time / 1000:8.1f} ms  {module}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import argparse
+import json
+import tempfile
+import time
+
+from sauber.core import FileHashChecker
+from sauber.entries import Entries
+from sauber.settings import HASH_ALGORITHM
+from sauber.utils import available_hash_algorithms, entry_columns, iter_directory
+
+from .tree import add_tree_arguments, generate_tree, tree_config
+
+QUERIES = [
+    "duplicates",
+    "duplicate_files",
+    "duplicate_directories",
+    "duplicate_music",
+    "duplicate_videos",
+    "duplicate_images",
+    "duplicate_documents",
+]
+
+parser = argparse.ArgumentParser(
+    description="Time every phase of FileHashChecker.iterate on a synthetic tree"
+)
+
+
+def parse_arguments():
+    parser.add_argument(
+        "--path",
+        help="Benchmark an existing tree instead of generating one",
+    )
+    add_tree_arguments(parser)
+    parser.add_argument(
+        "--jobs",
+        help="Number of files hashed in parallel (default: 1)",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "--hash-algo",
+        help=f"Hash algorithm (default: {HASH_ALGORITHM})",
+        choices=available_hash_algorithms(),
+        default=HASH_ALGORITHM,
+    )
+    parser.add_argument(
+        "--verify",
+        help="Compare candidates byte by byte instead of hashing them completely",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--repeat", help="Runs of every phase (default: 3)", type=int, default=3
+    )
+    parser.add_argument("--json", help="Print results as JSON", action="store_true")
+    return parser.parse_args()
+
+
+class Timer:
+    def __init__(self) -> None:
+        super().__init__()
+        self.timings = {}
+
+    def measure(self, phase, function, *args, **kwargs):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        self.timings[phase] = time.perf_counter() - start
+        return result
+
+
+def run_iterate(path, jobs, hash_algorithm, verify=False):
+    # Follows the steps of FileHashChecker.iterate, so that every phase is timed
+    timer = Timer()
+    checker = FileHashChecker(hash_algorithm=hash_algorithm, verify=verify)
+
+    walked = timer.measure("walk", list, iter_directory(path))
+
+    entries = timer.measure("metadata", lambda: Entries(entry_columns(walked)))
+    files = entries.take(entries.rows("is_file"))
+    directories = entries.take(entries.rows("is_dir"))
+
+    timer.measure("hashing", checker._add_files, files, jobs=jobs)
+    timer.measure("directory_hashing", checker._add_directories, directories)
+    timer.measure("duplicate_marking", checker._update_duplicates)
+
+    # Queries on the engine and through the DataFrame adapter
+    for query in QUERIES:
+        timer.measure(f"{query}_entries", checker.query, query)
+        timer.measure(query, getattr, checker, query)
+
+    return timer.timings, checker
+
+
+def main():
+    args = parse_arguments()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = args.path
+        tree = None
+        if path is None:
+            path = directory
+            tree = generate_tree(path, **tree_config(args))
+
+        runs = [
+            run_iterate(path, args.jobs, args.hash_algo, args.verify)
+            for _ in range(args.repeat)
+        ]
+
+    timings = {phase: min(run[phase] for run, _ in runs) for phase in runs[0][0]}
+    checker = runs[-1][1]
+    results = {
+        "config": {
+            **({} if args.path else tree_config(args)),
+            "path": args.path,
+            "jobs": args.jobs,
+            "hash_algorithm": args.hash_algo,
+            "verify": args.verify,
+            "repeat": args.repeat,
+        },
+        "tree": tree,
+        "entries": len(checker.df),
+        "duplicates": int(checker.df.is_duplicate.sum()),
+        "seconds": timings,
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    for phase, seconds in timings.items():
+        print(f"{phase:>30}  {seconds * 1000:10.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
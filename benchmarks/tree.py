@@ -0,0 +1,166 @@
+import argparse
+import json
+import math
+import pathlib
+import random
+import shutil
+
+SIZE_DISTRIBUTIONS = ["fixed", "uniform", "lognormal"]
+
+parser = argparse.ArgumentParser(
+    description="Generate a reproducible synthetic file tree for benchmarks"
+)
+
+
+def add_tree_arguments(parser):
+    parser.add_argument(
+        "--files", help="Number of files (default: 10000)", type=int, default=10000
+    )
+    parser.add_argument(
+        "--depth", help="Levels of directories (default: 3)", type=int, default=3
+    )
+    parser.add_argument(
+        "--fan-out",
+        help="Subdirectories per directory (default: 8)",
+        type=int,
+        default=8,
+    )
+    parser.add_argument(
+        "--size-distribution",
+        help="Distribution of the file sizes (default: lognormal)",
+        choices=SIZE_DISTRIBUTIONS,
+        default="lognormal",
+    )
+    parser.add_argument(
+        "--median-size",
+        help="Median file size in bytes (default: 16384)",
+        type=int,
+        default=16384,
+    )
+    parser.add_argument(
+        "--duplicate-ratio",
+        help="Share of files that copy another file (default: 0.2)",
+        type=float,
+        default=0.2,
+    )
+    parser.add_argument(
+        "--directory-duplicate-ratio",
+        help="Share of leaf directories that are copied (default: 0.05)",
+        type=float,
+        default=0.05,
+    )
+    parser.add_argument(
+        "--seed", help="Seed of the generator (default: 0)", type=int, default=0
+    )
+
+
+def parse_arguments():
+    parser.add_argument("path", help="Directory the tree is generated in")
+    add_tree_arguments(parser)
+    parser.add_argument("--json", help="Print the summary as JSON", action="store_true")
+    return parser.parse_args()
+
+
+def tree_config(args):
+    return {
+        "files": args.files,
+        "depth": args.depth,
+        "fan_out": args.fan_out,
+        "size_distribution": args.size_distribution,
+        "median_size": args.median_size,
+        "duplicate_ratio": args.duplicate_ratio,
+        "directory_duplicate_ratio": args.directory_duplicate_ratio,
+        "seed": args.seed,
+    }
+
+
+def random_size(rng, distribution, median_size):
+    if distribution == "fixed":
+        return median_size
+    if distribution == "uniform":
+        return rng.randint(0, 2 * median_size)
+    return int(rng.lognormvariate(math.log(max(median_size, 1)), 1.5))
+
+
+def random_bytes(rng, size):
+    return rng.getrandbits(8 * size).to_bytes(size, "little") if size else b""
+
+
+def generate_tree(
+    root,
+    files=10000,
+    depth=3,
+    fan_out=8,
+    size_distribution="lognormal",
+    median_size=16384,
+    duplicate_ratio=0.2,
+    directory_duplicate_ratio=0.05,
+    seed=0,
+):
+    rng = random.Random(seed)
+    root = pathlib.Path(root)
+
+    levels = [[root]]
+    for level in range(depth):
+        levels.append(
+            [
+                parent / f"d{level}_{index}"
+                for parent in levels[-1]
+                for index in range(fan_out)
+            ]
+        )
+    directories = [directory for level in levels for directory in level]
+    for directory in directories:
+        directory.mkdir(parents=True, exist_ok=True)
+
+    # Duplicates copy an earlier file, so they share its size. Only the paths and
+    # sizes of the originals are kept, not their contents.
+    originals = []
+    total_size = 0
+    for index in range(files):
+        if originals and rng.random() < duplicate_ratio:
+            original, size = rng.choice(originals)
+            content = None
+        else:
+            content = random_bytes(
+                rng, random_size(rng, size_distribution, median_size)
+            )
+            size = len(content)
+
+        path = rng.choice(directories) / f"f{index}.bin"
+        if content is None:
+            shutil.copyfile(original, path)
+        else:
+            path.write_bytes(content)
+            originals.append((path, size))
+        total_size += size
+
+    leaves = levels[-1] if depth else []
+    copied = rng.sample(leaves, round(len(leaves) * directory_duplicate_ratio))
+    for directory in copied:
+        shutil.copytree(directory, directory.with_name(f"{directory.name}_copy"))
+        total_size += sum(path.stat().st_size for path in directory.iterdir())
+
+    return {
+        "directories": len(directories) + len(copied),
+        "files": files + sum(len(list(path.iterdir())) for path in copied),
+        "unique_contents": len(originals),
+        "copied_directories": len(copied),
+        "total_size": total_size,
+    }
+
+
+def main():
+    args = parse_arguments()
+    summary = generate_tree(args.path, **tree_config(args))
+
+    if args.json:
+        print(json.dumps({"config": tree_config(args), "tree": summary}, indent=2))
+        return
+
+    for key, value in summary.items():
+        print(f"{key:>20}  {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,32 @@
 import argparse
+import cProfile
 import pathlib
+import pstats
+import sys
+import threading
+import tracemalloc
 
 from sauber import __version__
-from sauber.core import FileHashChecker
+from sauber.actions import ACTIONS, KEEP_POLICIES
+from sauber.cache import HashCache
+from sauber.progress import Progress, format_size
+from sauber.settings import (
+    BUFFER_SIZE,
+    HASH_ALGORITHM,
+    SIMILAR_DIRECTORIES_THRESHOLD,
+    SIMILAR_IMAGES_THRESHOLD,
+)
+from sauber.utils import available_hash_algorithms
+
+PRINTED_COLUMNS = ["hash", "is_file", "size", "name", "parent_name"]
+
+
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"{value} is not a positive number")
+    return number
+
 
 parser = argparse.ArgumentParser(
     description="Sauber - A tool for cleaning up the file system",
@@ -11,7 +35,11 @@ parser = argparse.ArgumentParser(
 
 
 def parse_arguments():
-    parser.add_argument("path", help="Search path for your files")
+    parser.add_argument(
+        "path",
+        help="Search paths for your files, scanned concurrently",
+        nargs="+",
+    )
 
     parser.add_argument(
         "--debug",
@@ -21,12 +49,102 @@ def parse_arguments():
         default="True",
     )
 
+    parser.add_argument(
+        "--jobs",
+        help="Number of files hashed in parallel (default: 1)",
+        type=positive_int,
+        default=1,
+    )
+
+    parser.add_argument(
+        "--executor",
+        help="Use threads or processes for parallel hashing (default: thread)",
+        choices=["thread", "process"],
+        default="thread",
+    )
+
+    parser.add_argument(
+        "--hash-algo",
+        help=f"Hash algorithm for files and directories (default: {HASH_ALGORITHM})",
+        choices=available_hash_algorithms(),
+        default=HASH_ALGORITHM,
+    )
+
+    parser.add_argument(
+        "--buffer-size",
+        help=f"Bytes read at once for full hashes (default: {BUFFER_SIZE})",
+        type=positive_int,
+        default=BUFFER_SIZE,
+    )
+
+    parser.add_argument(
+        "--verify",
+        help="Compare candidates byte by byte instead of hashing them completely",
+        action="store_true",
+    )
+
+    parser.add_argument(
+        "--no-cache", help="Do not use the persistent hash cache", action="store_true",
+    )
+
+    parser.add_argument(
+        "--cache-path",
+        help="Location of the hash cache (default: ~/.cache/sauber/hashes.sqlite)",
+    )
+
+    parser.add_argument(
+        "--merge",
+        help="Merge indexes exported by earlier runs into the results",
+        nargs="+",
+        default=[],
+    )
+
+    parser.add_argument(
+        "--export",
+        help="Save the index so that it can be merged later",
+    )
+
+    parser.add_argument(
+        "--progress",
+        help="Show the progress of hashing with rate and ETA on stderr",
+        action="store_true",
+    )
+
+    parser.add_argument(
+        "--stats",
+        help=(
+            "Show time, files and bytes of every phase of the scan, json is written "
+            "to stderr to keep it apart from the results"
+        ),
+        choices=["text", "json"],
+    )
+
+    parser.add_argument(
+        "--profile",
+        help=(
+            "Write cProfile stats of all threads to this file and tracemalloc data "
+            "next to it, worker processes of --executor process are not profiled"
+        ),
+    )
+
     duplicates_group = parser.add_argument_group("Show duplicates")
 
+    duplicates_group.add_argument(
+        "--stream",
+        help="Show duplicate files as soon as they are confirmed",
+        action="store_true",
+    )
+
     duplicates_group.add_argument(
         "--duplicates", help="Show all duplicates", action="store_true",
     )
 
+    duplicates_group.add_argument(
+        "--collapse",
+        help="Only show the topmost duplicate directories and loose duplicate files",
+        action="store_true",
+    )
+
     duplicates_group.add_argument(
         "--duplicate-files",
         help="Show all duplicate files (without folders)",
@@ -39,6 +157,19 @@ def parse_arguments():
         action="store_true",
     )
 
+    duplicates_group.add_argument(
+        "--similar-directories",
+        help=(
+            "Show directories whose files are mostly the same, with a Jaccard "
+            f"similarity of at least THRESHOLD (default: "
+            f"{SIMILAR_DIRECTORIES_THRESHOLD})"
+        ),
+        metavar="THRESHOLD",
+        type=float,
+        nargs="?",
+        const=SIMILAR_DIRECTORIES_THRESHOLD,
+    )
+
     duplicates_group.add_argument(
         "--duplicate-music", help="Show all duplicate music", action="store_true",
     )
@@ -51,12 +182,69 @@ def parse_arguments():
         "--duplicate-images", help="Show all duplicate images", action="store_true",
     )
 
+    duplicates_group.add_argument(
+        "--same-audio",
+        help="Show music with the same audio, ignoring tags and other metadata",
+        action="store_true",
+    )
+
+    duplicates_group.add_argument(
+        "--similar-images",
+        help=(
+            "Show resized or re-encoded copies of images, which differ in at most "
+            f"THRESHOLD bits of their perceptual hash (default: "
+            f"{SIMILAR_IMAGES_THRESHOLD}, requires Pillow)"
+        ),
+        metavar="THRESHOLD",
+        type=int,
+        nargs="?",
+        const=SIMILAR_IMAGES_THRESHOLD,
+    )
+
     duplicates_group.add_argument(
         "--duplicate-documents",
         help="Show all duplicate documents",
         action="store_true",
     )
 
+    duplicates_group.add_argument(
+        "--hard-links",
+        help="Show all hard links (they are not counted as duplicates)",
+        action="store_true",
+    )
+
+    dedup_group = parser.add_argument_group("Remove duplicates")
+
+    dedup_group.add_argument(
+        "--dedup",
+        help="Replace duplicate files with hard links or reflinks, or delete them",
+        choices=ACTIONS,
+    )
+
+    dedup_group.add_argument(
+        "--keep",
+        help=(
+            "Copy that is kept: the one with the shortest path, the oldest one or "
+            "one in the first of the --keep-root directories (default: shortest)"
+        ),
+        choices=KEEP_POLICIES,
+        default="shortest",
+    )
+
+    dedup_group.add_argument(
+        "--keep-root", help="Preferred directories for --keep root", nargs="+",
+    )
+
+    dedup_group.add_argument(
+        "--dry-run",
+        help="Only show what --dedup would do, without changing any file",
+        action="store_true",
+    )
+
+    dedup_group.add_argument(
+        "--journal", help="Append every step of --dedup to this JSON lines file",
+    )
+
     find_group = parser.add_argument_group("Find files")
 
     find_group.add_argument(
@@ -102,7 +290,7 @@ def print_usage_if_no_args(args):
         return
 
 
-def _handle_arguments(args, checker, keyword):
+def _handle_arguments(args, checker, keyword, collapse=False):
     args_dict = {
         key: value for (key, value) in vars(args).items() if key.startswith(keyword)
     }
@@ -112,32 +300,235 @@ def _handle_arguments(args, checker, keyword):
             print(
                 f'\n============ {(" ".join(key.split("_"))).capitalize()} ============'
             )
-            df = getattr(checker, key)
-            if len(df) > 0:
-                print(df[["hash", "is_file", "size", "name", "parent_name"]])
+            entries = checker.query(key, collapse)
+            if len(entries) > 0:
+                print_entries(entries)
             else:
                 print("None found.")
 
 
+def print_entries(entries):
+    try:
+        configure_display()
+    except ImportError:
+        # Without pandas every entry is printed as a plain line
+        for row in zip(entries["path"], *(entries[name] for name in PRINTED_COLUMNS)):
+            print("  ".join(str(value) for value in row))
+        return
+
+    print(entries.to_dataframe(sort=False)[PRINTED_COLUMNS])
+
+
 def handle_duplicate_arguments(args, checker):
-    _handle_arguments(args, checker, keyword="duplicate")
+    _handle_arguments(args, checker, keyword="duplicate", collapse=args.collapse)
+
+    if args.duplicates or args.duplicate_files:
+        print(f"\nReclaimable space: {checker.reclaimable_size} bytes")
+
+
+def handle_hard_link_arguments(args, checker):
+    _handle_arguments(args, checker, keyword="hard_links")
 
 
 def handle_find_arguments(args, checker):
     _handle_arguments(args, checker, keyword="find")
 
 
+def print_duplicate_groups(args, checker):
+    groups = checker.iter_duplicate_groups(
+        [pathlib.Path(path) for path in args.path],
+        debug=args.debug,
+        jobs=args.jobs,
+        executor=args.executor,
+    )
+
+    print(f"\n============ Duplicate files ============")
+    for group in groups:
+        print("\n".join(str(path) for path in group), end="\n\n", flush=True)
+
+
+def print_groups(title, groups):
+    print(f"\n============ {title} ============")
+    for group in groups:
+        print("\n".join(str(path) for path in group), end="\n\n")
+    if not groups:
+        print("None found.")
+
+
+def print_same_audio(args, checker):
+    if not args.same_audio:
+        return
+
+    groups = checker.same_audio(
+        debug=args.debug, jobs=args.jobs, executor=args.executor,
+    )
+    print_groups("Same audio", groups)
+
+
+def print_similar_directories(args, checker):
+    if args.similar_directories is None:
+        return
+
+    pairs = checker.similar_directories(args.similar_directories, debug=args.debug)
+
+    print(f"\n============ Similar directories ============")
+    for first, second, similarity, overlap in pairs:
+        print(
+            f"{first}\n{second}\n"
+            f"{similarity:.0%} similar, {format_size(overlap)} overlapping",
+            end="\n\n",
+        )
+    if not pairs:
+        print("None found.")
+
+
+def print_similar_images(args, checker):
+    if args.similar_images is None:
+        return
+
+    groups = checker.similar_images(
+        args.similar_images, debug=args.debug, jobs=args.jobs, executor=args.executor,
+    )
+    print_groups("Similar images", groups)
+
+
+def run_dedup(args, checker):
+    if args.dedup is None:
+        return
+
+    summary, records = checker.deduplicate(
+        args.dedup,
+        keep=args.keep,
+        roots=args.keep_root,
+        dry_run=args.dry_run,
+        journal=args.journal,
+        jobs=args.jobs,
+    )
+
+    print(f"\n============ Deduplicate ============")
+    for record in records:
+        reason = record.get("reason") or record.get("error")
+        print(
+            f"{record['status']:>8}  {record['path']} -> {record['keeper']}"
+            + (f" ({reason})" if reason else "")
+        )
+
+    reclaimed = format_size(summary["bytes_reclaimed"])
+    if summary["dry_run"]:
+        print(f"\nWould reclaim {reclaimed} with {summary['planned']} files", end="")
+    else:
+        print(f"\nReclaimed {reclaimed} with {summary['done']} files", end="")
+    print(f", {summary['skipped']} skipped, {summary['failed']} failed")
+
+
+def start_profile():
+    tracemalloc.start()
+    profilers = [cProfile.Profile()]
+
+    # Threads started from now on, like the hashing workers, get their own profiler
+    # on their first call. Since Python 3.12 the profiler of the main thread sees
+    # all threads and a second one can not be enabled.
+    def profile_thread(frame, event, arg):
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            sys.setprofile(None)
+            return
+        profilers.append(profiler)
+
+    threading.setprofile(profile_thread)
+    profilers[0].enable()
+    return profilers
+
+
+def write_profile(profilers, file_path):
+    threading.setprofile(None)
+    for profiler in profilers:
+        profiler.disable()
+    pstats.Stats(*profilers).dump_stats(file_path)
+
+    tracemalloc.take_snapshot().dump(f"{file_path}.tracemalloc")
+    tracemalloc.stop()
+
+    print(f"\nProfile written to {file_path} and {file_path}.tracemalloc")
+
+
+def print_stats(args, checker):
+    if args.stats == "json":
+        print(checker.stats.to_json(), file=sys.stderr)
+    else:
+        print(f"\n============ Stats ============")
+        print(checker.stats)
+
+
+def configure_display():
+    import pandas
+
+    pandas.set_option("display.max_columns", None)
+    pandas.set_option("display.max_rows", None)
+    pandas.set_option("display.width", 1000)
+
+
 def main():
     args = parse_arguments()
 
+    # The engine and numpy are only imported once the arguments are valid, so that
+    # --help and usage errors return right away
+    from sauber.core import FileHashChecker
+
     print_sauber()
     print_usage_if_no_args(args)
 
-    checker = FileHashChecker()
-    checker.iterate(pathlib.Path(args.path), debug=args.debug)
+    cache = None if args.no_cache else HashCache(args.cache_path)
+
+    checker = FileHashChecker(
+        cache=cache,
+        hash_algorithm=args.hash_algo,
+        buffer_size=args.buffer_size,
+        progress=Progress() if args.progress else None,
+        verify=args.verify,
+    )
+
+    profilers = start_profile() if args.profile else None
+
+    if args.stream:
+        print_duplicate_groups(args, checker)
+    else:
+        paths = [pathlib.Path(path) for path in args.path]
+        if len(paths) == 1:
+            checker.iterate(
+                paths[0], debug=args.debug, jobs=args.jobs, executor=args.executor,
+            )
+        else:
+            checker.iterate_roots(
+                paths, debug=args.debug, jobs=args.jobs, executor=args.executor,
+            )
+
+        if args.merge:
+            checker.merge(
+                args.merge, debug=args.debug, jobs=args.jobs, executor=args.executor,
+            )
+
+        if args.export:
+            checker.export_data(args.export)
+
+        handle_duplicate_arguments(args, checker)
+        handle_hard_link_arguments(args, checker)
+        handle_find_arguments(args, checker)
+        print_similar_directories(args, checker)
+        print_same_audio(args, checker)
+        print_similar_images(args, checker)
+        run_dedup(args, checker)
+
+    if profilers is not None:
+        write_profile(profilers, args.profile)
+
+    if args.stats:
+        print_stats(args, checker)
 
-    handle_duplicate_arguments(args, checker)
-    handle_find_arguments(args, checker)
+    if cache is not None:
+        cache.close()
 
 
 if __name__ == "__main__":
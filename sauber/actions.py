@@ -0,0 +1,224 @@
+import collections
+import json
+import os
+import pathlib
+import shutil
+import time
+
+from .settings import DEDUP_BATCH_SIZE
+from .utils import files_equal, map_files
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+ACTIONS = ["hardlink", "reflink", "delete"]
+KEEP_POLICIES = ["shortest", "oldest", "root"]
+
+# ioctl request that clones all extents of a file on Linux (btrfs, xfs, ...)
+FICLONE = 0x40049409
+
+# Copies are first created under this suffix next to the duplicate and then
+# renamed over it, so a duplicate is never missing if anything fails
+TEMPORARY_SUFFIX = ".sauber-tmp"
+
+
+def choose_keeper(group, keep="shortest", roots=None):
+    # Every file of a group is a dictionary with its path, size and mtime
+    if keep not in KEEP_POLICIES:
+        raise ValueError(
+            f"Unknown keep policy {keep}, choose one of {', '.join(KEEP_POLICIES)}"
+        )
+
+    if keep == "oldest":
+        return min(group, key=lambda file: (file["mtime"], str(file["path"])))
+
+    # Without a copy in any of the preferred roots the shortest path is kept
+    if keep == "root":
+        for root in roots or []:
+            inside = [
+                file
+                for file in group
+                if pathlib.Path(root) in (file["path"], *file["path"].parents)
+            ]
+            if inside:
+                return choose_keeper(inside, "shortest")
+
+    return min(group, key=lambda file: (len(str(file["path"])), str(file["path"])))
+
+
+def plan_actions(groups, keep="shortest", roots=None):
+    plan = []
+    for group in groups:
+        keeper = choose_keeper(group, keep, roots)
+        for file in group:
+            if file["path"] != keeper["path"]:
+                plan.append((keeper["path"], file["path"], file["size"]))
+    return plan
+
+
+def apply_action(action, keeper, path, size, dry_run=False):
+    record = {
+        "action": action,
+        "keeper": str(keeper),
+        "path": str(path),
+        "size": size,
+        "status": "skipped",
+        "reclaimed": 0,
+    }
+
+    try:
+        keeper_stat = os.stat(keeper)
+        stat_result = os.stat(path, follow_symlinks=False)
+
+        # The index may be outdated, so every copy is checked again before it is
+        # touched and only ever replaced by a file with the same content
+        if (keeper_stat.st_dev, keeper_stat.st_ino) == (
+            stat_result.st_dev,
+            stat_result.st_ino,
+        ):
+            record["reason"] = "already linked"
+        elif keeper_stat.st_size != size or stat_result.st_size != size:
+            record["reason"] = "size changed"
+        elif action == "hardlink" and keeper_stat.st_dev != stat_result.st_dev:
+            record["reason"] = "different device"
+        elif not files_equal(keeper, path):
+            record["reason"] = "content changed"
+        else:
+            # Other hard links keep the data of a copy on disk
+            reclaimed = size if stat_result.st_nlink == 1 else 0
+            if dry_run:
+                record.update(status="planned", reclaimed=reclaimed)
+            else:
+                ACTION_FUNCTIONS[action](keeper, path)
+                verified = verify_action(action, keeper, path)
+                record.update(
+                    status="done" if verified else "failed",
+                    reclaimed=reclaimed if verified else 0,
+                    verified=verified,
+                )
+    except OSError as error:
+        record.update(status="failed", error=str(error))
+
+    return record
+
+
+def replace_with_hard_link(keeper, path):
+    temporary = path.with_name(path.name + TEMPORARY_SUFFIX)
+    os.link(keeper, temporary)
+    replace(temporary, path)
+
+
+def replace_with_reflink(keeper, path):
+    if fcntl is None:
+        raise OSError("Reflinks are not supported on this platform")
+
+    temporary = path.with_name(path.name + TEMPORARY_SUFFIX)
+    with open(keeper, "rb") as source, open(temporary, "xb") as target:
+        try:
+            fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+            shutil.copystat(path, temporary)
+        except OSError:
+            os.remove(temporary)
+            raise
+
+    replace(temporary, path)
+
+
+def replace(temporary, path):
+    try:
+        os.replace(temporary, path)
+    except OSError:
+        os.remove(temporary)
+        raise
+
+
+def delete(keeper, path):
+    os.remove(path)
+
+
+ACTION_FUNCTIONS = {
+    "hardlink": replace_with_hard_link,
+    "reflink": replace_with_reflink,
+    "delete": delete,
+}
+
+
+def verify_action(action, keeper, path):
+    if action == "delete":
+        return not os.path.lexists(path) and os.path.exists(keeper)
+    if action == "hardlink":
+        return os.path.samefile(keeper, path)
+    return files_equal(keeper, path)
+
+
+def deduplicate(
+    plan,
+    action="hardlink",
+    dry_run=False,
+    journal=None,
+    jobs=1,
+    batch_size=DEDUP_BATCH_SIZE,
+    stats=None,
+):
+    if action not in ACTIONS:
+        raise ValueError(f"Unknown action {action}, choose one of {', '.join(ACTIONS)}")
+
+    def run(step):
+        keeper, path, size = step
+        return apply_action(action, keeper, path, size, dry_run)
+
+    records = []
+    journal_file = open(journal, "a") if journal is not None else None
+    try:
+        for start in range(0, len(plan), batch_size):
+            batch = plan[start : start + batch_size]
+
+            # Steps are journaled before they run, so that an interrupted batch
+            # can be told apart from one that finished
+            write_journal(
+                journal_file,
+                [
+                    {"action": action, "keeper": str(keeper), "path": str(path)}
+                    for keeper, path, _ in batch
+                ],
+                status="started",
+                dry_run=dry_run,
+            )
+            results = map_files(run, batch, jobs, "thread")
+            write_journal(journal_file, results, dry_run=dry_run)
+            records.extend(results)
+    finally:
+        if journal_file is not None:
+            journal_file.close()
+
+    statuses = collections.Counter(record["status"] for record in records)
+    summary = {
+        "action": action,
+        "dry_run": dry_run,
+        "files": len(records),
+        "bytes_reclaimed": sum(record["reclaimed"] for record in records),
+        "planned": statuses["planned"],
+        "done": statuses["done"],
+        "skipped": statuses["skipped"],
+        "failed": statuses["failed"],
+    }
+
+    if stats is not None:
+        stats.count("bytes_reclaimed", summary["bytes_reclaimed"])
+        stats.count("files_deduplicated", summary["done"])
+
+    return summary, records
+
+
+def write_journal(journal_file, records, dry_run=False, **fields):
+    if journal_file is None:
+        return
+
+    for record in records:
+        line = {"time": time.time(), "dry_run": dry_run, **record, **fields}
+        journal_file.write(json.dumps(line) + "\n")
+
+    journal_file.flush()
+    os.fsync(journal_file.fileno())
@@ -0,0 +1,152 @@
+import os
+import struct
+
+from .settings import BUFFER_SIZE, HASH_ALGORITHM
+from .utils import get_buffer, new_hasher
+
+ID3V1_SIZE = 128
+ID3V1_EXTENDED_SIZE = 227
+APE_FOOTER_SIZE = 32
+
+# Tags and metadata are skipped, only the ranges holding the encoded audio itself
+# are hashed. Nothing is decoded, so that tagging a track does not change its hash.
+
+
+def audio_ranges(file_path):
+    with open(file_path, "rb") as file:
+        return find_audio_ranges(file)
+
+
+def find_audio_ranges(file):
+    size = os.fstat(file.fileno()).st_size
+    start = skip_id3v2(file, 0, size)
+
+    file.seek(start)
+    magic = file.read(12)
+    if magic[:4] == b"fLaC":
+        return [(skip_flac_metadata(file, start + 4, size), size)]
+    if magic[4:8] == b"ftyp":
+        return mp4_boxes(file, start, size, b"mdat")
+    if magic[:4] == b"RIFF" and magic[8:12] == b"WAVE":
+        return riff_chunks(file, start + 12, size, b"data")
+
+    return [(start, strip_trailing_tags(file, start, size))]
+
+
+def skip_id3v2(file, start, size):
+    # Several ID3v2 tags may follow each other, their sizes are syncsafe integers
+    while start + 10 <= size:
+        file.seek(start)
+        header = file.read(10)
+        if header[:3] != b"ID3":
+            break
+        tag_size = 0
+        for byte in header[6:10]:
+            tag_size = (tag_size << 7) | (byte & 0x7F)
+        footer_size = 10 if header[5] & 0x10 else 0
+        start = min(start + 10 + tag_size + footer_size, size)
+    return start
+
+
+def strip_trailing_tags(file, start, end):
+    # ID3v1 (with its extended block) and APEv2 tags are appended to the audio
+    while True:
+        if end - start >= ID3V1_SIZE:
+            file.seek(end - ID3V1_SIZE)
+            if file.read(3) == b"TAG":
+                end -= ID3V1_SIZE
+                if end - start >= ID3V1_EXTENDED_SIZE:
+                    file.seek(end - ID3V1_EXTENDED_SIZE)
+                    if file.read(4) == b"TAG+":
+                        end -= ID3V1_EXTENDED_SIZE
+                continue
+
+        if end - start >= APE_FOOTER_SIZE:
+            file.seek(end - APE_FOOTER_SIZE)
+            footer = file.read(APE_FOOTER_SIZE)
+            if footer[:8] == b"APETAGEX":
+                tag_size, _, flags = struct.unpack("<III", footer[12:24])
+                if flags & 0x80000000:
+                    tag_size += APE_FOOTER_SIZE
+                end = max(end - tag_size, start)
+                continue
+
+        return end
+
+
+def skip_flac_metadata(file, start, size):
+    while start + 4 <= size:
+        file.seek(start)
+        header = file.read(4)
+        if len(header) < 4:
+            break
+        start += 4 + int.from_bytes(header[1:4], "big")
+        if header[0] & 0x80:
+            break
+    return min(start, size)
+
+
+def mp4_boxes(file, start, end, box_type):
+    ranges = []
+    while start + 8 <= end:
+        file.seek(start)
+        header = file.read(8)
+        if len(header) < 8:
+            break
+        box_size, current_type = struct.unpack(">I4s", header)
+        header_size = 8
+        if box_size == 1:
+            # Truncated files can end within the 64 bit size
+            large_size = file.read(8)
+            if len(large_size) < 8:
+                break
+            box_size = struct.unpack(">Q", large_size)[0]
+            header_size = 16
+        elif box_size == 0:
+            box_size = end - start
+        if box_size < header_size:
+            break
+
+        if current_type == box_type:
+            ranges.append((start + header_size, min(start + box_size, end)))
+        start += box_size
+    return ranges
+
+
+def riff_chunks(file, start, end, chunk_id):
+    ranges = []
+    while start + 8 <= end:
+        file.seek(start)
+        header = file.read(8)
+        if len(header) < 8:
+            break
+        current_id, chunk_size = struct.unpack("<4sI", header)
+        if current_id == chunk_id:
+            ranges.append((start + 8, min(start + 8 + chunk_size, end)))
+        # Chunks are padded to an even size
+        start += 8 + chunk_size + (chunk_size & 1)
+    return ranges
+
+
+def hash_audio(file_path, algorithm=HASH_ALGORITHM, buffer_size=BUFFER_SIZE):
+    hasher = new_hasher(algorithm)
+    buffer = get_buffer(buffer_size)
+    with open(file_path, "rb", buffering=0) as file, memoryview(buffer) as view:
+        for start, end in find_audio_ranges(file):
+            file.seek(start)
+            while start < end:
+                length = file.readinto(view[: min(buffer_size, end - start)])
+                if not length:
+                    break
+                hasher.update(view[:length])
+                start += length
+    return hasher.hexdigest()
+
+
+def audio_size(file_path):
+    # Files that vanished or cannot be parsed have no audio to compare
+    try:
+        ranges = audio_ranges(file_path)
+    except (OSError, struct.error):
+        return 0
+    return sum(end - start for start, end in ranges)
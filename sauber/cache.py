@@ -0,0 +1,132 @@
+import os
+import pathlib
+import sqlite3
+import threading
+import time
+
+from .settings import CACHE_MAX_ENTRIES
+
+# Keys looked up per query, SQLite allows at least 999 parameters per query
+QUERY_BATCH_SIZE = 200
+
+
+def default_cache_path():
+    cache_home = os.environ.get("XDG_CACHE_HOME") or pathlib.Path.home() / ".cache"
+    return pathlib.Path(cache_home) / "sauber" / "hashes.sqlite"
+
+
+class HashCache:
+    def __init__(self, path=None, max_entries=CACHE_MAX_ENTRIES) -> None:
+        super().__init__()
+        self.path = pathlib.Path(path) if path else default_cache_path()
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        # Roots scanned concurrently share one cache, so access is serialized
+        self.lock = threading.RLock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS hashes ("
+            "device INTEGER, inode INTEGER, size INTEGER, mtime INTEGER, kind TEXT, "
+            "digest TEXT NOT NULL, last_used INTEGER NOT NULL, "
+            "PRIMARY KEY (device, inode, size, mtime, kind))"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS hashes_last_used ON hashes (last_used)"
+        )
+
+        # Entries are only counted once, inserts keep track of new entries after that
+        self.entries = len(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM hashes").fetchone()[0]
+
+    def find(self, keys, kind):
+        found = {}
+        for start in range(0, len(keys), QUERY_BATCH_SIZE):
+            batch = keys[start : start + QUERY_BATCH_SIZE]
+            rows = self.connection.execute(
+                "SELECT device, inode, size, mtime, digest FROM hashes "
+                "WHERE kind = ? AND (device, inode, size, mtime) IN "
+                f"(VALUES {', '.join(['(?, ?, ?, ?)'] * len(batch))})",
+                [kind] + [value for key in batch for value in sqlite_key(key)],
+            )
+            for device, inode, size, mtime, digest in rows:
+                found[unsigned(device), unsigned(inode), size, mtime] = digest
+
+        return found
+
+    def get_many(self, keys, kind):
+        with self.lock:
+            found = self.find(list(keys), kind)
+            digests = [found.get(tuple(key)) for key in keys]
+
+            self.hits += len(found)
+            self.misses += len(digests) - len(found)
+
+            with self.connection:
+                self.connection.executemany(
+                    "UPDATE hashes SET last_used = ? WHERE device = ? AND inode = ? "
+                    "AND size = ? AND mtime = ? AND kind = ?",
+                    [(now(), *sqlite_key(key), kind) for key in found],
+                )
+
+            return digests
+
+    def set_many(self, items, kind):
+        with self.lock:
+            keys = list({tuple(key) for key, _ in items})
+            new_entries = len(keys) - len(self.find(keys, kind))
+
+            with self.connection:
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(*sqlite_key(key), kind, digest, now()) for key, digest in items],
+                )
+            self.entries += new_entries
+
+        self.evict()
+
+    def evict(self):
+        # Least recently used entries are dropped first
+        with self.lock:
+            excess = self.entries - self.max_entries
+            if excess > 0:
+                with self.connection:
+                    self.connection.execute(
+                        "DELETE FROM hashes WHERE rowid IN "
+                        "(SELECT rowid FROM hashes ORDER BY last_used LIMIT ?)",
+                        (excess,),
+                    )
+                self.entries -= excess
+
+    def close(self):
+        self.connection.close()
+
+
+def sqlite_key(key):
+    # SQLite integers are signed, but devices and inodes can use all 64 bits
+    device, inode, size, mtime = key
+    return signed(device), signed(inode), size, mtime
+
+
+def signed(value):
+    return value - 2 ** 64 if value >= 2 ** 63 else value
+
+
+def unsigned(value):
+    return value + 2 ** 64 if value < 0 else value
+
+
+def now():
+    # Nanoseconds since the epoch, time.time_ns() needs Python 3.7
+    return int(time.time() * 10 ** 9)
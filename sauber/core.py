@@ -1,211 +1,688 @@
-import hashlib
+import collections
+import functools
 import pathlib
+import stat
 
-import pandas
+import numpy
 
+from .actions import deduplicate, plan_actions
+from .audio import audio_size, hash_audio
+from .entries import Entries
+from .index import CompactIndex
 from .settings import (
+    BUFFER_SIZE,
+    CHUNK_SIZE,
+    HASH_ALGORITHM,
+    NOT_HASHED,
+    HASH_STAGE_NONE,
+    HASH_STAGE_HEAD,
+    HASH_STAGE_TAIL,
+    HASH_STAGE_FULL,
+    HASH_STAGE_VERIFIED,
+    STREAM_BATCH_SIZE,
+    DEDUP_BATCH_SIZE,
+    SIMILAR_IMAGES_THRESHOLD,
+    SIMILAR_DIRECTORIES_THRESHOLD,
+    DHASH_SIZE,
     MUSIC_FILE_EXTENSIONS,
     VIDEO_FILE_EXTENSIONS,
     IMAGE_FILE_EXTENSIONS,
     DOCUMENT_FILE_EXTENSIONS,
 )
+from .minhash import (
+    element_value,
+    jaccard_similarity,
+    lsh_candidates,
+    minhash_permutations,
+    minhash_signature,
+)
+from .similar import image_hash, similar_groups
+from .stats import Stats, timed
 from .utils import (
-    extract_file_suffix,
     hash_file,
-    get_size,
+    hash_file_ends,
+    hash_file_full,
     hash_text,
+    iter_directory,
+    link_key,
+    map_files,
+    new_hasher,
+    scan_directory,
 )
+from .verify import verify_groups
+
+HASH_STAGES = [
+    (HASH_STAGE_HEAD, hash_file),
+    (HASH_STAGE_TAIL, hash_file_ends),
+    (HASH_STAGE_FULL, hash_file_full),
+]
+
+# Bytes read per file by every stage, full hashes read the whole file
+STAGE_READ_SIZES = {
+    HASH_STAGE_HEAD: CHUNK_SIZE,
+    HASH_STAGE_TAIL: 2 * CHUNK_SIZE,
+    HASH_STAGE_FULL: None,
+}
 
-pandas.set_option("display.max_columns", None)
-pandas.set_option("display.max_rows", None)
-pandas.set_option("display.width", 1000)
+FILE_EXTENSIONS = {
+    "music": MUSIC_FILE_EXTENSIONS,
+    "videos": VIDEO_FILE_EXTENSIONS,
+    "images": IMAGE_FILE_EXTENSIONS,
+    "documents": DOCUMENT_FILE_EXTENSIONS,
+}
 
 
 class FileHashChecker:
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        cache=None,
+        hash_algorithm=HASH_ALGORITHM,
+        buffer_size=BUFFER_SIZE,
+        progress=None,
+        verify=False,
+    ) -> None:
         super().__init__()
-        self.df = initialize_file_hash_checker_dataframe()
+        new_hasher(hash_algorithm)
+        if buffer_size < 1:
+            raise ValueError(f"Buffer size must be positive, not {buffer_size}")
+
+        self.entries = Entries()
+        self.cache = cache
+        self.hash_algorithm = hash_algorithm
+        self.buffer_size = buffer_size
+        self.progress = progress
+        self.verify = verify
+        self.stats = Stats()
+        self._df = None
 
-    def iterate(self, path, debug=False):
+    @property
+    def df(self):
+        # The DataFrame is only built on demand and kept until the entries change
+        if self._df is None:
+            self._df = self.entries.to_dataframe()
+        return self._df
+
+    @timed("iterate")
+    def iterate(
+        self,
+        path,
+        debug=False,
+        jobs=1,
+        executor="thread",
+        baseline=None,
+        baseline_algorithm=None,
+    ):
         if debug:
             print(f"Iterating through {path}")
 
-        all_files = [file_path for file_path in pathlib.Path(path).rglob("*")]
-        files = [file_path for file_path in all_files if file_path.is_file()]
-        directories = [file_path for file_path in all_files if file_path.is_dir()]
+        with self.stats.phase("walk") as phase:
+            entries = Entries(scan_directory(path))
+            phase["files"] = len(entries)
+
+        files = entries.take(entries.rows("is_file"))
+        directories = entries.take(entries.rows("is_dir"))
 
-        self._add_files(files, debug)
-        self._add_directories(directories, debug)
+        known_hashes = None
+        known_directory_hashes = None
+
+        if baseline is not None:
+            baseline = prepare_baseline(
+                baseline, self.hash_algorithm, baseline_algorithm
+            )
+            known_hashes = unchanged_file_hashes(files, baseline)
+
+            if debug:
+                print(f"Reusing hashes of {len(known_hashes)} unchanged files...")
+
+        files = self._add_files(files, debug, jobs, executor, known_hashes)
+
+        if baseline is not None:
+            known_directory_hashes = unchanged_directory_hashes(
+                entries["path"], files, baseline
+            )
+
+            if debug:
+                print(
+                    f"Reusing hashes of {len(known_directory_hashes)} "
+                    f"unchanged directories..."
+                )
+
+        self._add_directories(directories, debug, known_directory_hashes)
         self._update_duplicates()
 
         if debug:
             print(f"Done iterating")
 
-    def _add_files(self, files, debug=False):
-        if debug:
-            print(f"Adding files to internal dataframe...")
+    def iterate_roots(self, paths, debug=False, jobs=1, executor="thread"):
+        paths = distinct_roots(paths)
+
+        # Every root is scanned by its own worker into a partial index
+        partials = map_files(
+            functools.partial(
+                self._iterate_partial, debug=debug, jobs=jobs, executor=executor
+            ),
+            paths,
+            len(paths),
+            "thread",
+        )
 
-        if not files:
-            if debug:
-                print(f"No files to add found.")
+        self.merge(partials, debug, jobs, executor)
+
+    def _iterate_partial(self, path, debug=False, jobs=1, executor="thread"):
+        partial = FileHashChecker(self.cache, self.hash_algorithm, self.buffer_size)
+        partial.stats = self.stats
+        partial.iterate(path, debug, jobs, executor)
+        return partial
+
+    @timed("merge")
+    def merge(self, partials, debug=False, jobs=1, executor="thread"):
+        combined = self.entries
+        for partial in partials:
+            # Partial indexes can also be merged from exported snapshots
+            if not isinstance(partial, FileHashChecker):
+                snapshot = partial
+                partial = FileHashChecker(hash_algorithm=self.hash_algorithm)
+                partial.import_data(snapshot)
+
+            check_hash_algorithm({partial.hash_algorithm}, self.hash_algorithm)
+            combined = combined.merge(partial.entries)
+
+        if len(combined) == 0:
             return
 
-        df = pandas.DataFrame(files, columns=["path"])
+        if debug:
+            print(f"Merging {len(combined)} entries...")
+
+        # A size that is unique within one partial index can still collide with
+        # files of another one, so the staged hashing runs again over all files.
+        # Known digests are reused and only missing stages are read from disk.
+        files = combined.take(combined.rows("is_file"))
+        directories = combined.take(combined.rows("is_dir"))
+        known_hashes = unchanged_file_hashes(files, combined)
+
+        self.entries = Entries()
+        files = self._add_files(files, debug, jobs, executor, known_hashes)
+
+        known_directory_hashes = unchanged_directory_hashes(
+            combined["path"], files, combined
+        )
+        self._add_directories(directories, debug, known_directory_hashes)
+        self._update_duplicates()
+
+    def iter_duplicate_groups(
+        self, path, debug=False, jobs=1, executor="thread", batch_size=STREAM_BATCH_SIZE
+    ):
+        roots = [path] if isinstance(path, (str, pathlib.PurePath)) else list(path)
 
         if debug:
-            print(f"Setting meta data...")
+            print(f"Collecting file sizes in {', '.join(map(str, roots))}...")
+
+        # Only the sizes are kept in the first pass, so that only files sharing their
+        # size with another file need to be kept in memory in the second one
+        sizes = numpy.fromiter(
+            (
+                stat_result.st_size
+                for _, _, stat_result, (_, _, is_symlink) in iter_roots(roots)
+                if stat.S_ISREG(stat_result.st_mode) and not is_symlink
+            ),
+            dtype=numpy.int64,
+        )
+        values, counts = numpy.unique(sizes, return_counts=True)
+        colliding_sizes = set(values[counts > 1].tolist())
+        del sizes, values, counts
 
-        set_size_column(df)
-        set_name_column(df)
-        set_parent_column(df)
-        set_is_file_column(df)
-        set_suffix_column(df)
+        if debug:
+            print(f"Collecting files with {len(colliding_sizes)} colliding sizes...")
+
+        buckets = {}
+        for parent, name, stat_result, identity in iter_roots(roots):
+            if (
+                stat.S_ISREG(stat_result.st_mode)
+                and not identity[2]
+                and stat_result.st_size in colliding_sizes
+            ):
+                buckets.setdefault(stat_result.st_size, []).append(
+                    (parent / name, stat_result, identity)
+                )
+
+        # Buckets of the same size are never split across batches
+        batch = []
+        for size in list(buckets):
+            batch.extend(buckets.pop(size))
+
+            if len(batch) >= batch_size or not buckets:
+                yield from self._confirm_duplicate_groups(batch, jobs, executor)
+                batch = []
+
+    def _confirm_duplicate_groups(self, candidates, jobs=1, executor="thread"):
+        columns = {
+            "path": [path for path, _, _ in candidates],
+            "size": [stat_result.st_size for _, stat_result, _ in candidates],
+            "device": [device for _, _, (device, _, _) in candidates],
+            "inode": [inode for _, _, (_, inode, _) in candidates],
+            "mtime": [stat_result.st_mtime_ns for _, stat_result, _ in candidates],
+            "is_symlink": [is_symlink for _, _, (_, _, is_symlink) in candidates],
+        }
+
+        set_hash_columns(
+            columns,
+            False,
+            jobs,
+            executor,
+            self.cache,
+            algorithm=self.hash_algorithm,
+            buffer_size=self.buffer_size,
+            stats=self.stats,
+            progress=self.progress,
+            verify=self.verify,
+        )
+
+        groups = {}
+        for path, size, digest, stage in zip(
+            columns["path"], columns["size"], columns["hash"], columns["hash_stage"]
+        ):
+            if stage == HASH_STAGE_FULL:
+                groups.setdefault((size, digest), []).append(path)
+
+        for key in sorted(groups):
+            if len(groups[key]) > 1:
+                yield sorted(groups[key])
+
+    @timed("similar_images")
+    def similar_images(
+        self, threshold=SIMILAR_IMAGES_THRESHOLD, debug=False, jobs=1, executor="thread"
+    ):
+        columns = self.entries.columns
+        rows = [
+            row
+            for row in self.entries.rows("is_file")
+            if columns["suffix"][row] in IMAGE_FILE_EXTENSIONS
+        ]
+
+        if debug:
+            print(f"Calculating perceptual hashes of {len(rows)} images...")
+
+        with self.stats.phase("image_hash") as phase:
+            digests = hash_files(
+                columns,
+                rows,
+                image_hash,
+                f"dhash{DHASH_SIZE}",
+                jobs,
+                executor,
+                self.cache,
+                phase=phase,
+                progress=self.progress,
+            )
+
+        # Images that could not be decoded have no hash and are never similar
+        hashes = {
+            columns["path"][row]: digest
+            for row, digest in zip(rows, digests)
+            if digest is not None
+        }
+        return similar_groups(hashes, threshold)
+
+    @timed("same_audio")
+    def same_audio(self, debug=False, jobs=1, executor="thread"):
+        columns = self.entries.columns
+        rows = [
+            row
+            for row in self.entries.rows("is_file")
+            if columns["suffix"][row] in MUSIC_FILE_EXTENSIONS
+        ]
+
+        if debug:
+            print(f"Locating the audio of {len(rows)} music files...")
+
+        with self.stats.phase("audio_size") as phase:
+            sizes = map_files(
+                audio_size, [columns["path"][row] for row in rows], jobs, executor
+            )
+            phase["files"] = len(rows)
+
+        # Only tracks whose audio has the same size can have the same audio, files
+        # without any audio found are never compared
+        size_counts = collections.Counter(sizes)
+        candidates = [
+            (row, size)
+            for row, size in zip(rows, sizes)
+            if size > 0 and size_counts[size] > 1
+        ]
+        self.stats.count("unique_audio_sizes_skipped", len(rows) - len(candidates))
+
+        if debug:
+            print(f"Calculating audio hashes of {len(candidates)} music files...")
+
+        with self.stats.phase("hash_audio") as phase:
+            digests = hash_files(
+                columns,
+                [row for row, _ in candidates],
+                functools.partial(
+                    hash_audio,
+                    algorithm=self.hash_algorithm,
+                    buffer_size=self.buffer_size,
+                ),
+                f"{self.hash_algorithm}:audio",
+                jobs,
+                executor,
+                self.cache,
+                phase=phase,
+                progress=self.progress,
+            )
+
+        groups = {}
+        for (row, size), digest in zip(candidates, digests):
+            if digest is not None:
+                groups.setdefault((size, digest), []).append(columns["path"][row])
+
+        return [sorted(groups[key]) for key in sorted(groups) if len(groups[key]) > 1]
+
+    @timed("similar_directories")
+    def similar_directories(self, threshold=SIMILAR_DIRECTORIES_THRESHOLD, debug=False):
+        columns = self.entries.columns
+
+        # Files are compared by their contents. A file with a unique size cannot
+        # be found anywhere else and only counts for the directories holding it.
+        contents = {}
+        children = {}
+        for path, parent, digest, stage, size, is_file in zip(
+            columns["path"],
+            columns["parent"],
+            columns["hash"],
+            columns["hash_stage"],
+            columns["size"],
+            columns["is_file"],
+        ):
+            children.setdefault(parent, []).append(path)
+            if is_file:
+                contents[path] = (size, digest if stage == HASH_STAGE_FULL else path)
+
+        if debug:
+            print(f"Calculating MinHash signatures of directories...")
+
+        # Children are signed before their parents, the signature of a directory is
+        # the minimum of its own files and the signatures of its subdirectories
+        permutations = minhash_permutations()
+        signatures = {}
+        with self.stats.phase("minhash") as phase:
+            for directory in sorted(
+                (columns["path"][row] for row in self.entries.rows("is_dir")),
+                key=lambda path: len(path.parts),
+                reverse=True,
+            ):
+                values = [
+                    element_value(contents[child])
+                    for child in children.get(directory, [])
+                    if child in contents
+                ]
+                parts = [
+                    signatures[child]
+                    for child in children.get(directory, [])
+                    if child in signatures
+                ]
+                if values:
+                    parts.append(minhash_signature(values, permutations))
+                if parts:
+                    signatures[directory] = numpy.min(parts, axis=0)
+                phase["files"] += len(values)
+
+        # A directory always resembles the directories it contains
+        candidates = [
+            (first, second)
+            for first, second in lsh_candidates(signatures, threshold)
+            if first not in second.parents and second not in first.parents
+        ]
 
         if debug:
-            print(f"Calculating md5 hashes...")
+            print(f"Comparing {len(candidates)} candidate pairs of directories...")
+
+        descendants = {}
+
+        def collect(directory):
+            if directory not in descendants:
+                found = set()
+                pending = [directory]
+                while pending:
+                    for child in children.get(pending.pop(), []):
+                        if child in contents:
+                            found.add(contents[child])
+                        else:
+                            pending.append(child)
+                descendants[directory] = found
+            return descendants[directory]
+
+        similar = []
+        for first, second in candidates:
+            similarity = jaccard_similarity(collect(first), collect(second))
+            if similarity >= threshold:
+                overlap = sum(size for size, _ in collect(first) & collect(second))
+                similar.append((first, second, similarity, overlap))
+
+        return sorted(similar, key=lambda pair: (-pair[3], -pair[2], pair[:2]))
+
+    @timed("add_files")
+    def _add_files(self, files, debug=False, jobs=1, executor="thread", known=None):
+        if debug:
+            print(f"Adding files to the index...")
+
+        if len(files) == 0:
+            if debug:
+                print(f"No files to add found.")
+            return files
+
+        set_hash_columns(
+            files.columns,
+            debug,
+            jobs,
+            executor,
+            self.cache,
+            known,
+            self.hash_algorithm,
+            self.buffer_size,
+            self.stats,
+            self.progress,
+            self.verify,
+        )
+
+        if debug and self.cache is not None:
+            print(f"Hash cache: {self.cache.hits} hits, {self.cache.misses} misses")
 
-        df.loc[:, "hash"] = df.apply(lambda row: hash_file(row.path), axis=1)
+        self.entries.extend(files)
+        self._df = None
 
-        self.df = self.df.reset_index().append(df, sort=False).set_index("path")
+        return files
 
-    def _add_directories(self, directories, debug=False):
+    @timed("add_directories")
+    def _add_directories(self, directories, debug=False, known=None):
         if debug:
-            print(f"Adding directories to internal dataframe...")
+            print(f"Adding directories to the index...")
 
-        if not directories:
+        if len(directories) == 0:
             if debug:
                 print(f"No directories to add found.")
             return
 
-        directories_df = pandas.DataFrame(directories, columns=["path"])
+        columns = directories.columns
+        columns["hash"] = [None] * len(directories)
 
-        set_size_column(directories_df)
-        set_name_column(directories_df)
-        set_parent_column(directories_df)
-        set_is_dir_column(directories_df)
+        for path, (digest, size) in (known or {}).items():
+            row = directories.positions[path]
+            columns["hash"][row] = digest
+            columns["size"][row] = size
 
-        self.df = self.df.append(directories_df.set_index("path"), sort=False)
+        self.entries.extend(directories)
+        self._df = None
         self._update_directories(debug)
 
     def _update_directories(self, debug=False):
         if debug:
             print(f"Updating directory information...")
 
-        no_dir_counts_df = (
-            self.files.groupby("parent").size().reset_index(name="number_no_dir_files")
+        columns = self.entries.columns
+        number_files = collections.Counter(columns["parent"])
+        number_no_dir_files = collections.Counter(
+            parent
+            for parent, is_file in zip(columns["parent"], columns["is_file"])
+            if is_file
         )
-        no_dir_counts_df.rename(columns={"parent": "path"}, inplace=True)
 
-        # Number of hashed files is number of actual files (no directories) in the beginning
-        # After iterating through all directories it will be number of all files
-        no_dir_counts_df["number_hashes"] = no_dir_counts_df.number_no_dir_files
-
-        self.df.update(no_dir_counts_df.set_index("path"))
-
-        all_file_counts_df = (
-            self.df.groupby("parent").size().reset_index(name="number_files")
-        )
-        all_file_counts_df.rename(columns={"parent": "path"}, inplace=True)
-        all_file_counts_df.loc[:, "name"] = all_file_counts_df.apply(
-            lambda row: row.path.name, axis=1
-        )
-
-        self.df.update(all_file_counts_df.set_index("path"))
-
-        self._handle_empty_folders(debug)
-
-        self.df.sort_index(inplace=True)
+        # Empty folders and folders containing only other folders count zero
+        for row in self.entries.rows("is_dir"):
+            path = columns["path"][row]
+            columns["number_files"][row] = number_files.get(path, 0)
+            columns["number_no_dir_files"][row] = number_no_dir_files.get(path, 0)
 
         self._update_folders_hash(debug)
 
-    def _handle_empty_folders(self, debug):
-        self.df.loc[
-            (self.df.is_dir == True) & (self.df.number_files.isnull()), "number_files"
-        ] = 0
-        self.df.loc[(self.df.number_files == 0), "number_hashes"] = 0
-        self.df.loc[(self.df.number_files == 0), "number_no_dir_files"] = 0
-
+    @timed("update_folders_hash")
     def _update_folders_hash(self, debug=False):
-        # First the lowest level in path tree
-
         if debug:
             print(f"Updating directory hashes...")
-            count = 1
-
-        while True:
-            if debug:
-                print(f"Iteration {count}...")
-                count += 1
 
-            no_hash_folders_df = self.directories.loc[
-                (
-                    (self.directories.number_hashes == self.directories.number_files)
-                    & (self.directories.hash.isnull())
+        columns = self.entries.columns
+        hashes = {}
+        sizes = {}
+        children = {}
+        for path, parent, digest, stage, size, is_file, device, inode in zip(
+            columns["path"],
+            columns["parent"],
+            columns["hash"],
+            columns["hash_stage"],
+            columns["size"],
+            columns["is_file"],
+            columns["device"],
+            columns["inode"],
+        ):
+            if is_file and stage != HASH_STAGE_FULL:
+                digest = unconfirmed_placeholder(
+                    digest,
+                    stage,
+                    size,
+                    self.hash_algorithm,
+                    link_key(device, inode, path),
                 )
-            ].copy()
-
-            if len(no_hash_folders_df) == 0:
-                break
+            hashes[path] = digest
+            sizes[path] = size
+            children.setdefault(parent, []).append(path)
 
-            paths = no_hash_folders_df.index.to_list()
-            files_df = self.df[self.df.parent.isin(paths)].copy()
+        pending = [
+            row for row in self.entries.rows("is_dir") if columns["hash"][row] is None
+        ]
 
-            sum_df = (
-                files_df.groupby("parent")[["hash"]]
-                .sum()
-                .reset_index()
-                .rename(columns={"parent": "path"})
+        # Children are always hashed before their parents. A directory hash only
+        # depends on the sorted hashes and sizes of its children, not on their names.
+        for row in sorted(
+            pending, key=lambda row: len(columns["path"][row].parts), reverse=True
+        ):
+            directory = columns["path"][row]
+            pairs = sorted(
+                (hashes[child], sizes[child]) for child in children.get(directory, [])
             )
+            hashes[directory] = hash_text(
+                "".join(f"{h}:{s}," for h, s in pairs), self.hash_algorithm
+            )
+            sizes[directory] = sum(size for _, size in pairs)
 
-            empty_directories_df = no_hash_folders_df[
-                no_hash_folders_df.number_files == 0
-            ].copy()
-            empty_directories_df.loc[:, "hash"] = ""
-            empty_directories_df = empty_directories_df[["hash"]]
-            empty_directories_df.reset_index(inplace=True)
-
-            sum_df = sum_df.append(empty_directories_df, sort=False)
+            columns["hash"][row] = hashes[directory]
+            columns["size"][row] = sizes[directory]
 
-            sum_df.loc[:, "hash"] = sum_df.apply(
-                lambda row: hash_text(row.hash), axis=1
-            )
-            self.df.update(sum_df.set_index("path").copy())
-
-            sum_df.loc[:, "parent"] = sum_df.apply(lambda row: row.path.parent, axis=1)
-            parents_df = (
-                sum_df.groupby("parent")
-                .size()
-                .reset_index(name="number_hashes")
-                .rename(columns={"parent": "path"})
-            )
-            parents_to_update_list = parents_df.path.to_list()
-            sum_df_to_update = self.df[self.df.index.isin(parents_to_update_list)][
-                ["number_hashes"]
-            ]
-            result_df = sum_df_to_update.add(
-                parents_df[
-                    parents_df.path.isin(sum_df_to_update.index.to_list())
-                ].set_index("path")
+    @timed("update_duplicates")
+    def _update_duplicates(self):
+        columns = self.entries.columns
+        keys = list(zip(columns["hash"], columns["size"], columns["is_file"]))
+        inodes = [
+            link_key(device, inode, path)
+            for path, device, inode in zip(
+                columns["path"], columns["device"], columns["inode"]
             )
-            self.df.update(result_df)
+        ]
+        confirmed = [
+            is_dir or stage == HASH_STAGE_FULL
+            for is_dir, stage in zip(columns["is_dir"], columns["hash_stage"])
+        ]
 
-    def _update_duplicates(self):
-        counts_df = (
-            self.df.reset_index()
-            .groupby(["hash", "size", "is_file"])
-            .size()
-            .reset_index(name="counts")
+        # Hard links of the same file are not duplicates of each other
+        copies = {}
+        for key, inode, is_confirmed in zip(keys, inodes, confirmed):
+            if is_confirmed:
+                copies.setdefault(key, set()).add(inode)
+
+        columns["is_duplicate"] = [
+            is_confirmed and len(copies[key]) > 1
+            for key, is_confirmed in zip(keys, confirmed)
+        ]
+
+        links = collections.Counter(
+            inode for inode, is_file in zip(inodes, columns["is_file"]) if is_file
         )
+        columns["is_hard_link"] = [
+            is_file and links[inode] > 1
+            for inode, is_file in zip(inodes, columns["is_file"])
+        ]
 
-        duplicate_hash_sizes = counts_df[counts_df.counts > 1][
-            ["hash", "size", "is_file"]
-        ].values.tolist()
+        self._df = None
 
-        self.df.loc[:, "is_duplicate"] = self.df.set_index(
-            ["hash", "size", "is_file"]
-        ).index.isin(duplicate_hash_sizes)
+    def query(self, name, collapse=False):
+        # Entries behind the DataFrame properties, available without pandas
+        columns = self.entries.columns
 
-        self.df["is_duplicate"] = self.df["is_duplicate"].astype("bool")
+        if name == "hard_links":
+            rows = sorted(
+                self.entries.rows("is_hard_link"),
+                key=lambda row: (
+                    columns["device"][row],
+                    columns["inode"][row],
+                    columns["path"][row],
+                ),
+            )
+            return self.entries.take(rows)
+
+        if name.startswith("find_"):
+            rows = sorted(range(len(self.entries)), key=columns["path"].__getitem__)
+            extensions = FILE_EXTENSIONS[name[len("find_") :]]
+        else:
+            rows = self.entries.rows("is_duplicate")
+            extensions = FILE_EXTENSIONS.get(name[len("duplicate_") :])
+
+            # Collapsing first leaves less to sort
+            if collapse:
+                rows = self._collapse_duplicates(rows)
+
+            # Sorted by hash and size, paths in descending order within a group
+            rows.sort(key=columns["path"].__getitem__, reverse=True)
+            rows.sort(key=lambda row: (columns["hash"][row], columns["size"][row]))
+
+            if name == "duplicate_files":
+                rows = [row for row in rows if columns["is_file"][row]]
+            elif name == "duplicate_directories":
+                rows = [row for row in rows if columns["is_dir"][row]]
+
+        if extensions is not None:
+            rows = [row for row in rows if columns["suffix"][row] in extensions]
+
+        return self.entries.take(rows)
+
+    def _collapse_duplicates(self, rows):
+        # Everything inside a duplicate directory is already covered by it. A group
+        # is only kept if at least one of its entries lies outside of duplicate
+        # directories, which leaves maximal duplicate subtrees and loose files.
+        columns = self.entries.columns
+        duplicate_directories = {
+            columns["path"][row] for row in rows if columns["is_dir"][row]
+        }
+
+        groups = {
+            row: (columns["hash"][row], columns["size"][row], columns["is_file"][row])
+            for row in rows
+        }
+        uncovered = {
+            groups[row]
+            for row in rows
+            if columns["parent"][row] not in duplicate_directories
+        }
+
+        return [row for row in rows if groups[row] in uncovered]
 
     @property
     def files(self):
@@ -217,125 +694,596 @@ class FileHashChecker:
 
     @property
     def duplicates(self):
-        return self.df[self.df.is_duplicate].sort_values(
-            ["hash", "size", "path"], ascending=[True, True, False]
-        )
+        return self.query("duplicates").to_dataframe(sort=False)
 
     @property
     def duplicate_files(self):
-        return self.df[self.df.is_duplicate & self.df.is_file].sort_values(
-            ["hash", "size", "path"], ascending=[True, True, False]
-        )
+        return self.query("duplicate_files").to_dataframe(sort=False)
 
     @property
     def duplicate_directories(self):
-        return self.df[self.df.is_duplicate & self.df.is_dir].sort_values(
-            ["hash", "size", "path"], ascending=[True, True, False]
-        )
+        return self.query("duplicate_directories").to_dataframe(sort=False)
+
+    @property
+    def collapsed_duplicates(self):
+        return self.query("duplicates", collapse=True).to_dataframe(sort=False)
+
+    @property
+    def hard_links(self):
+        return self.query("hard_links").to_dataframe(sort=False)
+
+    @property
+    def reclaimable_size(self):
+        # Every additional copy of a duplicate file could be freed, additional hard
+        # links to the same copy do not take up any space
+        columns = self.entries.columns
+        copies = {}
+        for row in self.entries.rows("is_duplicate"):
+            if columns["is_file"][row]:
+                key = (columns["hash"][row], columns["size"][row])
+                copies.setdefault(key, set()).add(
+                    (columns["device"][row], columns["inode"][row])
+                )
+
+        return sum((len(inodes) - 1) * size for (_, size), inodes in copies.items())
 
     @property
     def duplicate_music(self):
-        return self.duplicates[self.duplicates.suffix.isin(MUSIC_FILE_EXTENSIONS)]
+        return self.query("duplicate_music").to_dataframe(sort=False)
 
     @property
     def duplicate_videos(self):
-        return self.duplicates[self.duplicates.suffix.isin(VIDEO_FILE_EXTENSIONS)]
+        return self.query("duplicate_videos").to_dataframe(sort=False)
 
     @property
     def duplicate_images(self):
-        return self.duplicates[self.duplicates.suffix.isin(IMAGE_FILE_EXTENSIONS)]
+        return self.query("duplicate_images").to_dataframe(sort=False)
 
     @property
     def duplicate_documents(self):
-        return self.duplicates[self.duplicates.suffix.isin(DOCUMENT_FILE_EXTENSIONS)]
+        return self.query("duplicate_documents").to_dataframe(sort=False)
 
     @property
     def find_music(self):
-        return self.df[self.df.suffix.isin(MUSIC_FILE_EXTENSIONS)]
+        return self.query("find_music").to_dataframe(sort=False)
 
     @property
     def find_videos(self):
-        return self.df[self.df.suffix.isin(VIDEO_FILE_EXTENSIONS)]
+        return self.query("find_videos").to_dataframe(sort=False)
 
     @property
     def find_images(self):
-        return self.df[self.df.suffix.isin(IMAGE_FILE_EXTENSIONS)]
+        return self.query("find_images").to_dataframe(sort=False)
 
     @property
     def find_documents(self):
-        return self.df[self.df.suffix.isin(DOCUMENT_FILE_EXTENSIONS)]
-
-    def export_data(self, file_path="data.csv"):
-        self.df.to_csv(file_path)
-
-    def import_data(self, file_path="data.csv"):
-        imported_df = pandas.read_csv(file_path).set_index("path")
-
-        # First update existing rows
-        self.df.update(imported_df)
-
-        # Then add remaining rows
-        self.df.reset_index(inplace=True)
-        imported_df.reset_index(inplace=True)
-        self.df = self.df.append(
-            imported_df, ignore_index=True, sort=False
-        ).drop_duplicates()
-        self.df.set_index("path", inplace=True)
-
-
-def set_size_column(dataframe):
-    dataframe.loc[:, "size"] = dataframe.apply(lambda row: get_size(row.path), axis=1)
-
+        return self.query("find_documents").to_dataframe(sort=False)
+
+    def deduplicate(
+        self,
+        action="hardlink",
+        keep="shortest",
+        roots=None,
+        dry_run=False,
+        journal=None,
+        jobs=1,
+        batch_size=DEDUP_BATCH_SIZE,
+    ):
+        # One copy of every group of duplicate files is kept, all other copies are
+        # replaced by links to it or deleted
+        files = self.query("duplicate_files")
+        groups = {}
+        for path, digest, size, mtime in zip(
+            files["path"], files["hash"], files["size"], files["mtime"]
+        ):
+            groups.setdefault((digest, size), []).append(
+                {"path": path, "size": size, "mtime": mtime}
+            )
 
-def set_name_column(dataframe):
-    dataframe.loc[:, "name"] = dataframe.apply(lambda row: row.path.name, axis=1)
+        plan = plan_actions(groups.values(), keep, roots)
+
+        with self.stats.phase("deduplicate") as phase:
+            summary, records = deduplicate(
+                plan,
+                action,
+                dry_run,
+                journal,
+                jobs,
+                batch_size,
+                self.stats,
+            )
+            phase["files"] = summary["files"]
+            phase["bytes"] = sum(size for _, _, size in plan)
+
+        return summary, records
+
+    def compact(self):
+        return CompactIndex.from_entries(self.entries, self.hash_algorithm)
+
+    def export_data(self, file_path="data.sauber"):
+        # CSV is kept as a legacy format, everything else is a columnar snapshot
+        if pathlib.Path(file_path).suffix == ".csv":
+            from .frame import write_csv_snapshot
+
+            write_csv_snapshot(self.entries, file_path, self.hash_algorithm)
+        else:
+            self.compact().save(file_path)
+
+    def import_data(self, file_path="data.sauber"):
+        if pathlib.Path(file_path).suffix == ".csv":
+            from .frame import read_csv_snapshot
+
+            imported_df = read_csv_snapshot(file_path)
+
+            # Snapshots from before the hash algorithm was recorded always used md5
+            if "hash_algorithm" in imported_df:
+                algorithms = set(imported_df.pop("hash_algorithm").dropna())
+            else:
+                algorithms = {"md5"}
+            imported = Entries.from_dataframe(imported_df)
+        else:
+            # Every column is converted to entries, so the snapshot is read
+            # completely instead of memory mapped
+            index = CompactIndex.load(file_path)
+            imported = index.to_entries()
+            algorithms = {index.hash_algorithm}
+        check_hash_algorithm(algorithms, self.hash_algorithm)
+
+        self.entries = self.entries.merge(imported)
+        self._df = None
+
+
+def set_hash_columns(
+    columns,
+    debug=False,
+    jobs=1,
+    executor="thread",
+    cache=None,
+    known=None,
+    algorithm=HASH_ALGORITHM,
+    buffer_size=BUFFER_SIZE,
+    stats=None,
+    progress=None,
+    verify=False,
+):
+    stats = stats or Stats()
+    paths = columns["path"]
+    sizes = columns["size"]
+    hashes = [NOT_HASHED] * len(paths)
+    stages = [HASH_STAGE_NONE] * len(paths)
+
+    # The digests of the first stages are kept, so that later scans and merges can
+    # compare files without reading them again
+    stage_digests = {
+        HASH_STAGE_HEAD: [None] * len(paths),
+        HASH_STAGE_TAIL: [None] * len(paths),
+    }
+
+    # Hard links share their content, so only the first link of every inode is hashed
+    first_links = {}
+    links = [
+        first_links.setdefault(link_key(device, inode, row), row)
+        for row, (device, inode) in enumerate(zip(columns["device"], columns["inode"]))
+    ]
+    first_rows = list(first_links.values())
+
+    # Symbolic links only point to the content of another file, so they are never
+    # duplicates. Only files sharing their size with another file can be.
+    files = [row for row in first_rows if not columns["is_symlink"][row]]
+    size_counts = collections.Counter(sizes[row] for row in files)
+    candidates = [row for row in files if size_counts[sizes[row]] > 1]
+
+    stats.count("hard_links_skipped", len(paths) - len(first_rows))
+    stats.count("symbolic_links_skipped", len(first_rows) - len(files))
+    stats.count("unique_sizes_skipped", len(files) - len(candidates))
+
+    if debug:
+        print(f"Skipping {len(paths) - len(first_rows)} additional hard links...")
+        print(f"Skipping {len(first_rows) - len(files)} symbolic links...")
+        print(f"Skipping {len(files) - len(candidates)} files with a unique size...")
+
+    for stage, hash_function in HASH_STAGES:
+        hash_function = functools.partial(hash_function, algorithm=algorithm)
+        if stage == HASH_STAGE_FULL:
+            hash_function = functools.partial(hash_function, buffer_size=buffer_size)
+
+        if stage == HASH_STAGE_FULL and verify:
+            if debug:
+                print(f"Comparing {len(candidates)} files byte by byte...")
+
+            candidates = verify_candidates(
+                columns,
+                candidates,
+                hashes,
+                stages,
+                jobs,
+                executor,
+                known,
+                algorithm,
+                buffer_size,
+                stats,
+            )
 
+        if debug:
+            print(
+                f"Calculating {stage} {algorithm} hashes of {len(candidates)} files..."
+            )
 
-def set_parent_column(dataframe):
-    dataframe.loc[:, "parent"] = dataframe.apply(lambda row: row.path.parent, axis=1)
-    dataframe.loc[:, "parent_name"] = dataframe.apply(
-        lambda row: row.parent.name, axis=1
-    )
+        known_digests = None
+        if known is not None:
+            stage_hashes = known_stage_hashes(known, stage)
+            known_digests = [stage_hashes.get(paths[row]) for row in candidates]
+
+        with stats.phase(f"hash_{stage}") as phase:
+            digests = hash_files(
+                columns,
+                candidates,
+                hash_function,
+                f"{algorithm}:{stage}",
+                jobs,
+                executor,
+                cache,
+                known_digests,
+                phase,
+                STAGE_READ_SIZES[stage],
+                progress,
+            )
 
+        # Files that could not be read keep the hash of the previous stage and are
+        # never confirmed
+        unreadable = {row for row, digest in zip(candidates, digests) if digest is None}
+        stats.count("unreadable_files", len(unreadable))
+        candidates = [row for row in candidates if row not in unreadable]
+        digests = [digest for digest in digests if digest is not None]
+
+        for row, digest in zip(candidates, digests):
+            hashes[row] = digest
+            stages[row] = stage
+            if stage in stage_digests:
+                stage_digests[stage][row] = digest
+
+        if stage == HASH_STAGE_HEAD:
+            # The first chunk already covers small files completely
+            for row in candidates:
+                if sizes[row] <= CHUNK_SIZE:
+                    stages[row] = HASH_STAGE_FULL
+            candidates = [row for row in candidates if sizes[row] > CHUNK_SIZE]
+
+        groups = collections.Counter((sizes[row], hashes[row]) for row in candidates)
+        candidates = [row for row in candidates if groups[sizes[row], hashes[row]] > 1]
+
+    # A known full hash is never replaced by the hash of an earlier stage. Older
+    # snapshots only know the full hash, so files of the same size are hashed
+    # completely to compare them with it.
+    if known is not None:
+        full_hashes = known_stage_hashes(known, HASH_STAGE_FULL)
+        known_full = [
+            row
+            for row in first_rows
+            if stages[row] != HASH_STAGE_FULL and paths[row] in full_hashes
+        ]
+        for row in known_full:
+            hashes[row] = full_hashes[paths[row]]
+            stages[row] = HASH_STAGE_FULL
+
+        known_sizes = {sizes[row] for row in known_full}
+        rows = [
+            row
+            for row in files
+            if stages[row] != HASH_STAGE_FULL and sizes[row] in known_sizes
+        ]
+        if rows:
+            with stats.phase(f"hash_{HASH_STAGE_FULL}") as phase:
+                digests = hash_files(
+                    columns,
+                    rows,
+                    functools.partial(
+                        hash_file_full, algorithm=algorithm, buffer_size=buffer_size
+                    ),
+                    f"{algorithm}:{HASH_STAGE_FULL}",
+                    jobs,
+                    executor,
+                    cache,
+                    None,
+                    phase,
+                    STAGE_READ_SIZES[HASH_STAGE_FULL],
+                    progress,
+                )
+            stats.count("unreadable_files", digests.count(None))
+            for row, digest in zip(rows, digests):
+                if digest is not None:
+                    hashes[row] = digest
+                    stages[row] = HASH_STAGE_FULL
+
+    for row, first_row in enumerate(links):
+        hashes[row] = hashes[first_row]
+        stages[row] = stages[first_row]
+        for digests in stage_digests.values():
+            digests[row] = digests[first_row]
+
+    columns["hash"] = hashes
+    columns["hash_stage"] = stages
+    columns["head_hash"] = stage_digests[HASH_STAGE_HEAD]
+    columns["tail_hash"] = stage_digests[HASH_STAGE_TAIL]
+
+
+def verify_candidates(
+    columns,
+    candidates,
+    hashes,
+    stages,
+    jobs=1,
+    executor="thread",
+    known=None,
+    algorithm=HASH_ALGORITHM,
+    buffer_size=BUFFER_SIZE,
+    stats=None,
+):
+    paths = columns["path"]
+    sizes = columns["size"]
+    full_hashes = known_stage_hashes(known, HASH_STAGE_FULL) if known else {}
+
+    groups = {}
+    for row in candidates:
+        groups.setdefault((sizes[row], hashes[row]), []).append(row)
+
+    # Groups with known full hashes are still hashed, so that the files without one
+    # can be matched with them. The files of all other groups are compared byte by
+    # byte and only equal files get their full hash.
+    hashed = []
+    verified = []
+    for group in groups.values():
+        if any(paths[row] in full_hashes for row in group):
+            hashed.extend(group)
+        else:
+            verified.append(group)
+
+    with (stats or Stats()).phase("verify") as phase:
+        confirmed = verify_groups(
+            [[paths[row] for row in group] for group in verified],
+            jobs,
+            executor,
+            algorithm,
+            buffer_size,
+            phase=phase,
+        )
 
-def _set_is_file_and_is_dir_column(dataframe, is_file):
-    dataframe.loc[:, "is_file"] = is_file
-    dataframe.loc[:, "is_dir"] = not is_file
+    rows = {paths[row]: row for group in verified for row in group}
+    for row in rows.values():
+        stages[row] = HASH_STAGE_VERIFIED
+    for group, digest in confirmed:
+        for path in group:
+            hashes[rows[path]] = digest
+            stages[rows[path]] = HASH_STAGE_FULL
+
+    return hashed
+
+
+def hash_files(
+    columns,
+    rows,
+    hash_function,
+    kind,
+    jobs=1,
+    executor="thread",
+    cache=None,
+    known=None,
+    phase=None,
+    read_size=None,
+    progress=None,
+):
+    phase = {} if phase is None else phase
+
+    digests = [None] * len(rows) if known is None else list(known)
+
+    missing = [index for index, digest in enumerate(digests) if digest is None]
+    phase["baseline_hits"] = phase.get("baseline_hits", 0) + len(digests) - len(missing)
+
+    if cache is not None:
+        keys = [
+            (
+                columns["device"][row],
+                columns["inode"][row],
+                columns["size"][row],
+                columns["mtime"][row],
+            )
+            for row in rows
+        ]
+        # Without an inode, files of the same size and mtime would share their key
+        cacheable = [index for index in missing if keys[index][1]]
+        cached = cache.get_many([keys[index] for index in cacheable], kind)
+
+        for index, digest in zip(cacheable, cached):
+            digests[index] = digest
+        looked_up = len(missing)
+        missing = [index for index in missing if digests[index] is None]
+        phase["cache_hits"] = phase.get("cache_hits", 0) + looked_up - len(missing)
+
+    sizes = [columns["size"][rows[index]] for index in missing]
+    if read_size is not None:
+        sizes = [min(size, read_size) for size in sizes]
+    phase["files"] = phase.get("files", 0) + len(missing)
+    phase["bytes"] = phase.get("bytes", 0) + sum(sizes)
+
+    callback = None
+    if progress is not None and missing:
+        progress.start(f"Hashing {kind}", len(missing), sum(sizes))
+        read_sizes = iter(sizes)
+
+        def callback(digest):
+            progress.advance(1, next(read_sizes))
+
+    paths = [columns["path"][rows[index]] for index in missing]
+    try:
+        computed = map_files(
+            functools.partial(hash_readable, hash_function),
+            paths,
+            jobs,
+            executor,
+            callback,
+        )
+    finally:
+        if callback is not None:
+            progress.finish()
+
+    for index, digest in zip(missing, computed):
+        digests[index] = digest
+
+    if cache is not None:
+        cache.set_many(
+            [
+                (keys[index], digests[index])
+                for index in missing
+                if keys[index][1] and digests[index] is not None
+            ],
+            kind,
+        )
 
+    return digests
 
-def set_is_file_column(dataframe):
-    _set_is_file_and_is_dir_column(dataframe, is_file=True)
 
+def hash_readable(hash_function, path):
+    # Files can vanish or become unreadable after the walk and files of merged
+    # snapshots may not exist on this machine at all. They get no digest.
+    try:
+        return hash_function(path)
+    except OSError:
+        return None
 
-def set_is_dir_column(dataframe):
-    _set_is_file_and_is_dir_column(dataframe, is_file=False)
 
+def check_hash_algorithm(algorithms, expected_algorithm):
+    # Hashes of different algorithms can never be compared
+    if set(algorithms) - {expected_algorithm}:
+        raise ValueError(
+            f"Data hashed with {', '.join(sorted(algorithms))} "
+            f"can not be combined with {expected_algorithm} hashes"
+        )
 
-def set_suffix_column(dataframe):
-    dataframe.loc[:, "suffix"] = dataframe.apply(
-        lambda row: extract_file_suffix(row.path), axis=1
-    )
 
+def prepare_baseline(baseline, algorithm=HASH_ALGORITHM, baseline_algorithm=None):
+    # Checkers and compact indexes know their hash algorithm, entries and
+    # DataFrames have to be given theirs
+    if isinstance(baseline, (FileHashChecker, CompactIndex)):
+        baseline_algorithm = baseline.hash_algorithm
+    elif baseline_algorithm is None:
+        raise ValueError(
+            "The hash algorithm of the baseline is unknown, pass baseline_algorithm"
+        )
+    check_hash_algorithm({baseline_algorithm}, algorithm)
+
+    if isinstance(baseline, FileHashChecker):
+        return baseline.entries
+    if isinstance(baseline, CompactIndex):
+        return baseline.to_entries()
+    if isinstance(baseline, Entries):
+        return baseline
+    return Entries.from_dataframe(baseline)
+
+
+def unchanged_file_hashes(files, baseline):
+    known = {}
+    for path, size, mtime in zip(files["path"], files["size"], files["mtime"]):
+        row = baseline.positions.get(path)
+        if (
+            row is not None
+            and baseline["is_file"][row]
+            and baseline["size"][row] == size
+            and baseline["mtime"][row] == mtime
+        ):
+            known[path] = (
+                baseline["hash"][row],
+                baseline["hash_stage"][row],
+                size,
+                baseline["head_hash"][row],
+                baseline["tail_hash"][row],
+            )
 
-def initialize_file_hash_checker_dataframe():
-    df = pandas.DataFrame(
-        columns=[
-            "path",
-            "hash",
-            "size",
-            "name",
-            "parent",
-            "parent_name",
-            "suffix",
-            "is_file",
-            "is_dir",
-            "is_duplicate",
-            "number_hashes",
-            "number_files",
-            "number_no_dir_files",
-        ]
-    )
-    df.is_duplicate = df.is_duplicate.astype("bool")
-    df.set_index("path", inplace=True)
+    return known
+
+
+def known_stage_hashes(known, stage):
+    stage_hashes = {}
+    for path, (digest, known_stage, size, head, tail) in known.items():
+        # Older snapshots only know the hash of the last stage. The head hash of a
+        # small file is its full hash and verified files keep their tail hash.
+        if stage == HASH_STAGE_HEAD and head is not None:
+            stage_hashes[path] = head
+        elif stage == HASH_STAGE_TAIL and tail is not None:
+            stage_hashes[path] = tail
+        elif (
+            known_stage == stage
+            or (
+                stage == HASH_STAGE_HEAD
+                and known_stage == HASH_STAGE_FULL
+                and size <= CHUNK_SIZE
+            )
+            or (stage == HASH_STAGE_TAIL and known_stage == HASH_STAGE_VERIFIED)
+        ):
+            stage_hashes[path] = digest
+
+    return stage_hashes
+
+
+def unchanged_directory_hashes(paths, files, baseline):
+    # Directory hashes are only recomputed along the ancestors of changed entries
+    current_paths = set(paths)
+    deleted = [path for path in baseline["path"] if path not in current_paths]
+    added = [path for path in current_paths if path not in baseline]
+
+    rehashed = []
+    for path, digest, stage in zip(files["path"], files["hash"], files["hash_stage"]):
+        row = baseline.positions.get(path)
+        if (
+            row is None
+            or baseline["hash"][row] != digest
+            or baseline["hash_stage"][row] != stage
+        ):
+            rehashed.append(path)
+
+    changed_directories = set()
+    for path in deleted + added + rehashed:
+        for parent in path.parents:
+            if parent in changed_directories:
+                break
+            changed_directories.add(parent)
 
-    return df
+    return {
+        path: (digest, size)
+        for path, digest, size, is_dir in zip(
+            baseline["path"], baseline["hash"], baseline["size"], baseline["is_dir"]
+        )
+        if is_dir
+        and path in current_paths
+        and path not in changed_directories
+        and digest is not None
+        and size is not None
+    }
+
+
+def unconfirmed_placeholder(
+    digest, stage, size, algorithm=HASH_ALGORITHM, identity=None
+):
+    # Files without a full hash are already known to differ from all other files.
+    # Their stage, partial hash and size usually tell them apart, but verified and
+    # unreadable files can share all of them, so their inode (or their path without
+    # one) is included as well.
+    return hash_text(f"{stage}{digest}{size}{identity}", algorithm)
+
+
+def iter_roots(roots):
+    for root in distinct_roots(roots):
+        yield from iter_directory(root)
+
+
+def distinct_roots(roots):
+    # Roots inside other roots are already scanned with them
+    roots = [pathlib.Path(root) for root in roots]
+    resolved = [root.resolve() for root in roots]
+    return [
+        root
+        for index, (root, path) in enumerate(zip(roots, resolved))
+        if not any(
+            other in path.parents or (other == path and other_index < index)
+            for other_index, other in enumerate(resolved)
+        )
+    ]
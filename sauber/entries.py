@@ -0,0 +1,89 @@
+COLUMNS = [
+    "path",
+    "hash",
+    "hash_stage",
+    "head_hash",
+    "tail_hash",
+    "size",
+    "name",
+    "parent",
+    "parent_name",
+    "suffix",
+    "is_file",
+    "is_dir",
+    "is_duplicate",
+    "is_hard_link",
+    "is_symlink",
+    "number_files",
+    "number_no_dir_files",
+    "device",
+    "inode",
+    "mtime",
+]
+
+FLAG_COLUMNS = ["is_file", "is_dir", "is_duplicate", "is_hard_link", "is_symlink"]
+
+
+# Columnar store of all files and directories, one plain list per column. Rows are
+# found by path through the positions dictionary.
+class Entries:
+    def __init__(self, columns=None) -> None:
+        super().__init__()
+        columns = columns or {}
+        length = len(columns["path"]) if "path" in columns else 0
+
+        self.columns = {}
+        for name in COLUMNS:
+            default = False if name in FLAG_COLUMNS else None
+            self.columns[name] = list(columns.get(name, [default] * length))
+
+        self.positions = {path: row for row, path in enumerate(self.columns["path"])}
+
+    def __len__(self):
+        return len(self.columns["path"])
+
+    def __contains__(self, path):
+        return path in self.positions
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def get(self, path, name):
+        return self.columns[name][self.positions[path]]
+
+    def rows(self, name):
+        return [row for row, value in enumerate(self.columns[name]) if value]
+
+    def take(self, rows):
+        return Entries(
+            {
+                name: [values[row] for row in rows]
+                for name, values in self.columns.items()
+            }
+        )
+
+    def extend(self, other):
+        offset = len(self)
+        for name, values in self.columns.items():
+            values.extend(other.columns[name])
+        for row, path in enumerate(other.columns["path"]):
+            self.positions[path] = offset + row
+
+    def merge(self, other):
+        # Rows of the other entries replace rows with the same path
+        merged = self.take(
+            [row for row, path in enumerate(self.columns["path"]) if path not in other]
+        )
+        merged.extend(other)
+        return merged
+
+    def to_dataframe(self, sort=True):
+        from .frame import entries_to_dataframe
+
+        return entries_to_dataframe(self, sort)
+
+    @classmethod
+    def from_dataframe(cls, dataframe):
+        from .frame import dataframe_to_columns
+
+        return cls(dataframe_to_columns(dataframe))
@@ -0,0 +1,55 @@
+import pathlib
+
+import pandas
+
+from .entries import COLUMNS, FLAG_COLUMNS
+
+# pandas is only needed to present entries as DataFrames and to read CSV files,
+# the engine itself works on plain lists
+
+
+def entries_to_dataframe(entries, sort=True):
+    dataframe = pandas.DataFrame(
+        {name: entries.columns[name] for name in COLUMNS}, columns=COLUMNS
+    )
+    dataframe = dataframe.astype({name: bool for name in FLAG_COLUMNS})
+    dataframe = dataframe.set_index("path")
+
+    return dataframe.sort_index() if sort else dataframe
+
+
+def dataframe_to_columns(dataframe):
+    dataframe = dataframe.reset_index()
+
+    # Snapshots read from CSV files have string paths
+    for name in ["path", "parent"]:
+        dataframe[name] = [
+            value if isinstance(value, pathlib.PurePath) else pathlib.Path(value)
+            for value in dataframe[name]
+        ]
+
+    columns = {}
+    for name in COLUMNS:
+        if name in dataframe:
+            values = dataframe[name].astype(object)
+            columns[name] = values.where(values.notnull(), None).tolist()
+
+    return columns
+
+
+def read_csv_snapshot(file_path):
+    dataframe = pandas.read_csv(file_path, index_col="path")
+
+    # CSV stores paths as plain strings and flags with missing values as objects
+    dataframe.index = dataframe.index.map(pathlib.Path)
+    dataframe["parent"] = dataframe.parent.map(pathlib.Path)
+    for column in FLAG_COLUMNS:
+        if column in dataframe:
+            dataframe[column] = dataframe[column].fillna(False).astype(bool)
+
+    return dataframe
+
+
+def write_csv_snapshot(entries, file_path, hash_algorithm):
+    dataframe = entries_to_dataframe(entries)
+    dataframe.assign(hash_algorithm=hash_algorithm).to_csv(file_path)
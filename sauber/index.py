@@ -0,0 +1,317 @@
+import json
+import os
+import pathlib
+import sys
+
+import numpy
+
+from .entries import Entries
+from .settings import (
+    HASH_ALGORITHM,
+    NOT_HASHED,
+    HASH_STAGE_NONE,
+    HASH_STAGE_HEAD,
+    HASH_STAGE_TAIL,
+    HASH_STAGE_FULL,
+    HASH_STAGE_VERIFIED,
+)
+
+HASH_STAGE_CODES = [
+    HASH_STAGE_NONE,
+    HASH_STAGE_HEAD,
+    HASH_STAGE_TAIL,
+    HASH_STAGE_FULL,
+    HASH_STAGE_VERIFIED,
+]
+SNAPSHOT_VERSION = 1
+
+
+# Typed, columnar form of the FileHashChecker entries. Parent directories are
+# interned and referenced by id, directories and names share encoded buffers and
+# digests are fixed size binary values. Head and tail digests are only kept for the
+# rows that have them. Suffixes and devices are stored as codes. Paths are only
+# rebuilt by to_entries. It is only the serialization form of exported snapshots,
+# scans keep working on Entries.
+class CompactIndex:
+    def __init__(
+        self,
+        directory_data,
+        directory_offsets,
+        columns,
+        suffixes,
+        hash_algorithm=HASH_ALGORITHM,
+        devices=None,
+    ) -> None:
+        super().__init__()
+        self.directory_data = directory_data
+        self.directory_offsets = directory_offsets
+        self.columns = columns
+        self.suffixes = suffixes
+        self.hash_algorithm = hash_algorithm
+        # Without devices the device column holds the devices themselves
+        self.devices = devices
+
+    def __len__(self):
+        return len(self.columns["parent"])
+
+    @classmethod
+    def from_entries(cls, entries, hash_algorithm=HASH_ALGORITHM):
+        columns = entries.columns
+
+        directory_ids = {}
+        parent = numpy.fromiter(
+            (
+                directory_ids.setdefault(str(path), len(directory_ids))
+                for path in columns["parent"]
+            ),
+            dtype=numpy.int32,
+            count=len(entries),
+        )
+
+        name_data, name_offsets = encode_strings(columns["name"])
+
+        suffixes = sorted(
+            {suffix for suffix in columns["suffix"] if suffix is not None}
+        )
+        suffix_codes = {suffix: code for code, suffix in enumerate(suffixes)}
+        stage_codes = numpy.array(
+            [
+                HASH_STAGE_CODES.index(stage) if stage else -1
+                for stage in columns["hash_stage"]
+            ],
+            dtype=numpy.int8,
+        )
+        is_file = numpy.array(columns["is_file"], dtype=bool)
+
+        devices, device_codes = numpy.unique(
+            numpy.array(columns["device"], dtype=numpy.uint64), return_inverse=True
+        )
+
+        compact_columns = {
+            "parent": parent,
+            "name_data": name_data,
+            "name_offsets": name_offsets,
+            "suffix": numpy.array(
+                [suffix_codes.get(suffix, -1) for suffix in columns["suffix"]],
+                dtype=numpy.int16,
+            ),
+            "digest": encode_digests(columns["hash"], stage_codes),
+            "hash_stage": stage_codes,
+            "size": numpy.array(columns["size"], dtype=numpy.int64),
+            "is_file": is_file,
+            "is_dir": ~is_file,
+            "is_duplicate": numpy.array(columns["is_duplicate"], dtype=bool),
+            "is_hard_link": numpy.array(columns["is_hard_link"], dtype=bool),
+            "is_symlink": numpy.array(columns["is_symlink"], dtype=bool),
+            "number_files": _counts(columns["number_files"]),
+            "number_no_dir_files": _counts(columns["number_no_dir_files"]),
+            "device": device_codes.astype(
+                numpy.int16 if len(devices) < 2 ** 15 else numpy.int64
+            ),
+            "inode": numpy.array(columns["inode"], dtype=numpy.uint64),
+            "mtime": numpy.array(columns["mtime"], dtype=numpy.int64),
+        }
+        for stage in ["head", "tail"]:
+            (
+                compact_columns[f"{stage}_rows"],
+                compact_columns[f"{stage}_digest"],
+            ) = encode_stage_digests(columns[f"{stage}_hash"])
+
+        return cls(
+            *encode_strings(list(directory_ids)),
+            compact_columns,
+            suffixes,
+            hash_algorithm,
+            devices,
+        )
+
+    @classmethod
+    def from_dataframe(cls, dataframe, hash_algorithm=HASH_ALGORITHM):
+        return cls.from_entries(Entries.from_dataframe(dataframe), hash_algorithm)
+
+    @classmethod
+    def load(cls, path, mmap=False):
+        path = pathlib.Path(path)
+        metadata = json.loads((path / "metadata.json").read_text())
+        if metadata["version"] != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version {metadata['version']}")
+
+        # Memory mapped columns are only paged in when they are used
+        mmap_mode = "r" if mmap else None
+        columns = {
+            name: numpy.load(path / f"{name}.npy", mmap_mode=mmap_mode)
+            for name in metadata["columns"]
+        }
+
+        return cls(
+            numpy.load(path / "directory_data.npy", mmap_mode=mmap_mode),
+            numpy.load(path / "directory_offsets.npy", mmap_mode=mmap_mode),
+            columns,
+            metadata["suffixes"],
+            metadata["hash_algorithm"],
+            (
+                numpy.array(metadata["devices"], dtype=numpy.uint64)
+                if "devices" in metadata
+                else None
+            ),
+        )
+
+    def save(self, path):
+        path = pathlib.Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+
+        numpy.save(path / "directory_data.npy", self.directory_data)
+        numpy.save(path / "directory_offsets.npy", self.directory_offsets)
+        for name, column in self.columns.items():
+            numpy.save(path / f"{name}.npy", column)
+
+        metadata = {
+            "version": SNAPSHOT_VERSION,
+            "hash_algorithm": self.hash_algorithm,
+            "suffixes": self.suffixes,
+            "columns": list(self.columns),
+            **({} if self.devices is None else {"devices": self.devices.tolist()}),
+        }
+        (path / "metadata.json").write_text(json.dumps(metadata))
+
+    @property
+    def directories(self):
+        return decode_strings(self.directory_data, self.directory_offsets)
+
+    @property
+    def names(self):
+        return decode_strings(self.columns["name_data"], self.columns["name_offsets"])
+
+    @property
+    def nbytes(self):
+        return (
+            sum(column.nbytes for column in self.columns.values())
+            + self.directory_data.nbytes
+            + self.directory_offsets.nbytes
+            + sum(sys.getsizeof(suffix) for suffix in self.suffixes)
+            + (0 if self.devices is None else self.devices.nbytes)
+        )
+
+    def to_entries(self):
+        columns = self.columns
+        directories = [pathlib.Path(directory) for directory in self.directories]
+        parents = [directories[parent] for parent in columns["parent"].tolist()]
+        names = self.names
+        is_file = columns["is_file"].tolist()
+        stage_codes = columns["hash_stage"]
+        devices = columns["device"]
+        if self.devices is not None:
+            devices = self.devices[devices]
+
+        def counts(name):
+            # Counts only apply to directories
+            return [
+                None if file else count
+                for file, count in zip(is_file, columns[name].tolist())
+            ]
+
+        return Entries(
+            {
+                "path": [parent / name for parent, name in zip(parents, names)],
+                "hash": decode_digests(columns["digest"], stage_codes),
+                "hash_stage": [
+                    HASH_STAGE_CODES[code] if code >= 0 else None
+                    for code in stage_codes.tolist()
+                ],
+                "head_hash": self.stage_digests("head"),
+                "tail_hash": self.stage_digests("tail"),
+                "size": columns["size"].tolist(),
+                "name": names,
+                "parent": parents,
+                "parent_name": [parent.name for parent in parents],
+                "suffix": [
+                    self.suffixes[code] if code >= 0 else None
+                    for code in columns["suffix"].tolist()
+                ],
+                "is_file": is_file,
+                "is_dir": columns["is_dir"].tolist(),
+                "is_duplicate": columns["is_duplicate"].tolist(),
+                "is_hard_link": columns["is_hard_link"].tolist(),
+                # Older snapshots do not know symbolic links
+                "is_symlink": (
+                    columns["is_symlink"].tolist()
+                    if "is_symlink" in columns
+                    else [False] * len(self)
+                ),
+                "number_files": counts("number_files"),
+                "number_no_dir_files": counts("number_no_dir_files"),
+                "device": devices.tolist(),
+                "inode": columns["inode"].tolist(),
+                "mtime": columns["mtime"].tolist(),
+            }
+        )
+
+    def stage_digests(self, stage):
+        # Snapshots written before head and tail digests were kept have none
+        if f"{stage}_rows" not in self.columns:
+            return [None] * len(self)
+        return decode_stage_digests(
+            self.columns[f"{stage}_rows"], self.columns[f"{stage}_digest"], len(self)
+        )
+
+    def to_dataframe(self):
+        return self.to_entries().to_dataframe()
+
+
+def encode_strings(strings):
+    encoded = [os.fsencode(string) for string in strings]
+    total = sum(len(string) for string in encoded)
+    offset_type = numpy.int32 if total < 2 ** 31 else numpy.int64
+    offsets = numpy.zeros(len(encoded) + 1, dtype=offset_type)
+    numpy.cumsum([len(string) for string in encoded], out=offsets[1:])
+    return numpy.frombuffer(b"".join(encoded), dtype=numpy.uint8), offsets
+
+
+def decode_strings(data, offsets):
+    data = data.tobytes()
+    offsets = offsets.tolist()
+    return [os.fsdecode(data[start:end]) for start, end in zip(offsets, offsets[1:])]
+
+
+def encode_digests(hashes, stage_codes):
+    hashed = (stage_codes != 0) & numpy.array(
+        [digest is not None for digest in hashes], dtype=bool
+    )
+    digests = [
+        bytes.fromhex(digest) for digest, keep in zip(hashes, hashed.tolist()) if keep
+    ]
+    digest_size = max((len(digest) for digest in digests), default=0)
+
+    data = numpy.zeros(len(hashes), dtype=f"V{max(digest_size, 1)}")
+    if digests:
+        data[hashed] = numpy.frombuffer(b"".join(digests), dtype=f"V{digest_size}")
+
+    return data
+
+
+def decode_digests(digests, stage_codes):
+    return [
+        NOT_HASHED if stage == 0 else digest.tobytes().hex()
+        for digest, stage in zip(digests, stage_codes.tolist())
+    ]
+
+
+def encode_stage_digests(hashes):
+    rows = [row for row, digest in enumerate(hashes) if digest is not None]
+    digests = [bytes.fromhex(hashes[row]) for row in rows]
+    digest_size = max((len(digest) for digest in digests), default=1)
+    return (
+        numpy.array(rows, dtype=numpy.int32),
+        numpy.frombuffer(b"".join(digests), dtype=f"V{digest_size}").copy(),
+    )
+
+
+def decode_stage_digests(rows, digests, length):
+    hashes = [None] * length
+    for row, digest in zip(rows.tolist(), digests):
+        hashes[row] = digest.tobytes().hex()
+    return hashes
+
+
+def _counts(column):
+    return numpy.array([count or 0 for count in column], dtype=numpy.int32)
@@ -0,0 +1,72 @@
+import hashlib
+import itertools
+
+import numpy
+
+from .settings import MINHASH_PERMUTATIONS, MINHASH_RECALL
+
+# Element values and permutation coefficients stay below this prime, so that
+# a * value + b never overflows 64 bits
+PRIME = (1 << 31) - 1
+
+# Elements combined into one signature at once, which bounds the memory per step
+SIGNATURE_CHUNK_SIZE = 4096
+
+
+def element_value(element):
+    digest = hashlib.blake2b(repr(element).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % PRIME
+
+
+def minhash_permutations(count=MINHASH_PERMUTATIONS, seed=0):
+    generator = numpy.random.default_rng(seed)
+    return (
+        generator.integers(1, PRIME, count, dtype=numpy.uint64),
+        generator.integers(0, PRIME, count, dtype=numpy.uint64),
+    )
+
+
+def minhash_signature(values, permutations):
+    # The minimum of every permutation over the elements of a set, two sets share
+    # each minimum with a probability equal to their Jaccard similarity
+    a, b = permutations
+    values = numpy.asarray(values, dtype=numpy.uint64)
+
+    signature = numpy.full(len(a), PRIME, dtype=numpy.uint64)
+    for start in range(0, len(values), SIGNATURE_CHUNK_SIZE):
+        chunk = values[start : start + SIGNATURE_CHUNK_SIZE, numpy.newaxis]
+        numpy.minimum(signature, ((chunk * a + b) % PRIME).min(axis=0), out=signature)
+
+    return signature
+
+
+def lsh_rows(threshold, permutations=MINHASH_PERMUTATIONS, recall=MINHASH_RECALL):
+    # Signatures are cut into bands of r rows, items sharing all rows of any band
+    # are candidates. Pairs of similarity s become candidates with a probability of
+    # 1 - (1 - s**r)**bands, longer bands give fewer candidates below the threshold.
+    for rows in range(permutations, 1, -1):
+        bands = permutations // rows
+        if 1 - (1 - threshold ** rows) ** bands >= recall:
+            return rows
+    return 1
+
+
+def lsh_candidates(signatures, threshold):
+    candidates = set()
+    permutations = len(next(iter(signatures.values()), []))
+    rows = lsh_rows(threshold, permutations)
+    for band in range(permutations // rows):
+        buckets = {}
+        for item, signature in signatures.items():
+            key = signature[band * rows : (band + 1) * rows].tobytes()
+            buckets.setdefault(key, []).append(item)
+
+        for bucket in buckets.values():
+            candidates.update(itertools.combinations(sorted(bucket), 2))
+
+    return candidates
+
+
+def jaccard_similarity(first, second):
+    union = len(first | second)
+    return len(first & second) / union if union else 0.0
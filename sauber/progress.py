@@ -0,0 +1,106 @@
+import sys
+import threading
+import time
+
+from .settings import PROGRESS_INTERVAL, PROGRESS_LOG_INTERVAL
+
+
+class Progress:
+    def __init__(self, stream=None, interval=None) -> None:
+        super().__init__()
+        self.stream = stream or sys.stderr
+        self.is_tty = self.stream.isatty()
+
+        # Logs get fewer lines than a terminal, which overwrites a single line
+        if interval is None:
+            interval = PROGRESS_INTERVAL if self.is_tty else PROGRESS_LOG_INTERVAL
+        self.interval = interval
+
+        self.description = ""
+        self.total_files = 0
+        self.total_bytes = 0
+        self.files = 0
+        self.bytes = 0
+        self.start_time = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self, description, total_files, total_bytes):
+        self.finish()
+
+        self.description = description
+        self.total_files = total_files
+        self.total_bytes = total_bytes
+        self.files = 0
+        self.bytes = 0
+        self.start_time = time.perf_counter()
+
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def advance(self, files=1, size=0):
+        # Only counts, all formatting and output happens in the reporting thread
+        self.files += files
+        self.bytes += size
+
+    def finish(self):
+        if self._thread is None:
+            return
+
+        self._stopped.set()
+        self._thread.join()
+        self._thread = None
+
+        self.report()
+        if self.is_tty:
+            self.stream.write("\n")
+            self.stream.flush()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.report()
+
+    def report(self):
+        self.write(self.format())
+
+    def format(self):
+        elapsed = time.perf_counter() - self.start_time
+        rate = self.bytes / elapsed if elapsed > 0 else 0.0
+
+        if self.bytes >= self.total_bytes:
+            eta = "0s"
+        elif rate > 0:
+            eta = format_duration((self.total_bytes - self.bytes) / rate)
+        else:
+            eta = "unknown"
+
+        return (
+            f"{self.description}: {self.files}/{self.total_files} files, "
+            f"{format_size(self.bytes)}/{format_size(self.total_bytes)}, "
+            f"{format_size(rate)}/s, ETA {eta}"
+        )
+
+    def write(self, line):
+        if self.is_tty:
+            self.stream.write(f"\r\033[K{line}")
+        else:
+            self.stream.write(f"{line}\n")
+        self.stream.flush()
+
+
+def format_size(size):
+    for unit in ["B", "KB", "MB", "GB", "TB"]:
+        if size < 1024 or unit == "TB":
+            return f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}h{minutes:02}m"
+    if minutes:
+        return f"{minutes}m{seconds:02}s"
+    return f"{seconds}s"
@@ -1,5 +1,61 @@
 CHUNK_SIZE = 4096
 
+# Read buffer for full hashes. Larger files are memory mapped instead.
+BUFFER_SIZE = 1024 * 1024
+MMAP_THRESHOLD = 64 * 1024 * 1024
+
+HASH_ALGORITHM = "md5"
+
+HASHLIB_ALGORITHMS = ["md5", "sha1", "blake2b", "blake2s"]
+
+# Only available if the xxhash package is installed
+XXHASH_ALGORITHMS = ["xxh64", "xxh3_64", "xxh3_128"]
+
+NOT_HASHED = "not hashed"
+
+# Hashing stages in the order they are applied, each one only to the survivors
+# of the previous one. Only files that reached the full stage can be duplicates.
+HASH_STAGE_NONE = "none"
+HASH_STAGE_HEAD = "head"
+HASH_STAGE_TAIL = "tail"
+HASH_STAGE_FULL = "full"
+
+# Files compared byte by byte with all candidates of the same size and tail hash
+# and found to differ from each of them. Their hash stays the tail hash.
+HASH_STAGE_VERIFIED = "verified"
+
+# Limits of the byte-wise verification of candidates, shared by all workers
+VERIFY_MAX_OPEN_FILES = 256
+VERIFY_BUFFER_LIMIT = 64 * 1024 * 1024
+
+CACHE_MAX_ENTRIES = 5000000
+
+# Minimum number of candidates hashed together when streaming duplicate groups
+STREAM_BATCH_SIZE = 1000
+
+# Duplicates replaced or deleted per batch, every batch is journaled as a whole
+DEDUP_BATCH_SIZE = 1000
+
+# Bytes compared at once before a duplicate is replaced or deleted. This does not
+# depend on the buffer size of hashing, so no setting can weaken the comparison.
+COMPARE_CHUNK_SIZE = 64 * 1024
+
+# Seconds between progress updates on a terminal and in logs
+PROGRESS_INTERVAL = 0.5
+PROGRESS_LOG_INTERVAL = 10
+
+# Perceptual image hashes have DHASH_SIZE**2 bits (at most 64), images whose
+# hashes differ in at most SIMILAR_IMAGES_THRESHOLD bits are shown as similar
+DHASH_SIZE = 8
+SIMILAR_IMAGES_THRESHOLD = 10
+
+# Directories are near duplicates if the Jaccard similarity of the contents of
+# their files reaches SIMILAR_DIRECTORIES_THRESHOLD. Candidates are found with
+# MinHash signatures, which find pairs at the threshold with MINHASH_RECALL.
+SIMILAR_DIRECTORIES_THRESHOLD = 0.8
+MINHASH_PERMUTATIONS = 128
+MINHASH_RECALL = 0.95
+
 MUSIC_FILE_EXTENSIONS = [".mp3", ".flac", ".m4a", ".wav"]
 
 VIDEO_FILE_EXTENSIONS = [
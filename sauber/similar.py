@@ -0,0 +1,167 @@
+import itertools
+
+import numpy
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+from .settings import DHASH_SIZE
+
+
+def image_hash(file_path, hash_size=DHASH_SIZE):
+    # Difference hash: every bit tells whether a pixel of a small grayscale copy is
+    # brighter than its right neighbour, which survives resizing and re-encoding
+    if Image is None:
+        raise ImportError("Similar images can only be found if Pillow is installed")
+
+    try:
+        with Image.open(file_path) as image:
+            # JPEG images are decoded at a reduced scale right away
+            image.draft("L", (hash_size * 8, hash_size * 8))
+            pixels = (
+                image.convert("L")
+                .resize((hash_size + 1, hash_size), Image.LANCZOS)
+                .tobytes()
+            )
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+
+    value = 0
+    for row in range(hash_size):
+        start = row * (hash_size + 1)
+        for column in range(hash_size):
+            value = (value << 1) | (pixels[start + column] > pixels[start + column + 1])
+
+    return format(value, f"0{hash_size * hash_size // 4}x")
+
+
+# Number of set bits of every byte value
+BYTE_BIT_COUNTS = numpy.array(
+    [bin(value).count("1") for value in range(256)], dtype=numpy.uint8
+)
+
+# Blocks with at most this many bits are looked up in a table instead of a search
+BLOCK_TABLE_BITS = 22
+
+
+def hamming_distance(first, second):
+    return bin(first ^ second).count("1")
+
+
+def bit_counts(values):
+    return BYTE_BIT_COUNTS[values.view(numpy.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+def flip_masks(bits, radius):
+    return [
+        sum(1 << bit for bit in combination)
+        for distance in range(radius + 1)
+        for combination in itertools.combinations(range(bits), distance)
+    ]
+
+
+def binomial(n, k):
+    # Ways to choose k of n bits, like math.comb, which needs Python 3.8
+    result = 1
+    for i in range(k):
+        result = result * (n - i) // (i + 1)
+    return result
+
+
+def block_count(count, threshold, bits):
+    # Every flipped block is looked up once per hash and finds count / 2 ** block_bits
+    # other hashes on average, the number of blocks with the least work is used
+    def work(blocks):
+        block_bits = bits // blocks
+        lookups = sum(
+            binomial(block_bits, distance)
+            for distance in range(threshold // blocks + 1)
+        )
+        return blocks * lookups * count * (1 + count / 2 ** block_bits)
+
+    return min(range(1, min(threshold + 1, bits) + 1), key=work)
+
+
+def similar_pairs(values, threshold, bits=64):
+    # Multi-index hashing: the hashes are split into blocks and two hashes within
+    # the threshold have at least one block that differs in at most threshold //
+    # blocks bits. Only hashes whose blocks match after flipping that many bits are
+    # compared, which avoids comparing every pair.
+    values = numpy.asarray(values, dtype=numpy.uint64)
+    count = len(values)
+    if count < 2:
+        return numpy.empty((0, 2), dtype=numpy.int64)
+
+    blocks = block_count(count, threshold, bits)
+    radius = threshold // blocks
+    bounds = [bits * block // blocks for block in range(blocks + 1)]
+
+    pairs = [numpy.empty((0, 2), dtype=numpy.int64)]
+    for start, end in zip(bounds, bounds[1:]):
+        keys = (values >> numpy.uint64(start)) & numpy.uint64((1 << (end - start)) - 1)
+        order = numpy.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        if end - start <= BLOCK_TABLE_BITS:
+            keys = keys.astype(numpy.int64)
+            table = numpy.searchsorted(
+                sorted_keys, numpy.arange(2 ** (end - start) + 1, dtype=numpy.uint64)
+            )
+
+        for mask in flip_masks(end - start, radius):
+            flipped = keys ^ keys.dtype.type(mask)
+            if end - start <= BLOCK_TABLE_BITS:
+                left, right = table[flipped], table[flipped + 1]
+            else:
+                left = numpy.searchsorted(sorted_keys, flipped, "left")
+                right = numpy.searchsorted(sorted_keys, flipped, "right")
+
+            # Every hash is paired with all hashes in the range of its flipped block
+            firsts = numpy.flatnonzero(right > left)
+            left, lengths = left[firsts], right[firsts] - left[firsts]
+            offsets = numpy.arange(lengths.sum()) - numpy.repeat(
+                numpy.cumsum(lengths) - lengths, lengths
+            )
+            seconds = order[numpy.repeat(left, lengths) + offsets]
+            firsts = numpy.repeat(firsts, lengths)
+
+            candidates = firsts < seconds
+            firsts, seconds = firsts[candidates], seconds[candidates]
+            close = bit_counts(values[firsts] ^ values[seconds]) <= threshold
+            pairs.append(numpy.stack([firsts[close], seconds[close]], axis=1))
+
+    return numpy.unique(numpy.concatenate(pairs), axis=0)
+
+
+def similar_groups(hashes, threshold):
+    # Images are grouped transitively, every image of a group is within the
+    # threshold of at least one other image of the same group. Equal hashes are
+    # only compared once.
+    items = {}
+    for item, digest in hashes.items():
+        items.setdefault(int(digest, 16), []).append(item)
+    values = list(items)
+    bits = 4 * max((len(digest) for digest in hashes.values()), default=0)
+
+    parents = list(range(len(values)))
+
+    def find(index):
+        while parents[index] != index:
+            parents[index] = parents[parents[index]]
+            index = parents[index]
+        return index
+
+    for first, second in similar_pairs(values, threshold, bits).tolist():
+        first, second = find(first), find(second)
+        if first != second:
+            parents[max(first, second)] = min(first, second)
+
+    groups = {}
+    for index, value in enumerate(values):
+        groups.setdefault(find(index), []).extend(items[value])
+
+    return sorted(
+        (sorted(group) for group in groups.values() if len(group) > 1),
+        key=lambda group: group[0],
+    )
@@ -0,0 +1,110 @@
+import contextlib
+import functools
+import json
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def peak_rss():
+    if resource is None:
+        return None
+
+    # Linux reports kilobytes, macOS bytes
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Stats:
+    def __init__(self) -> None:
+        super().__init__()
+        self.phases = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        # Work done inside the phase is counted on the yielded record
+        record = {"files": 0, "bytes": 0}
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            self.add_phase(name, time.perf_counter() - start, **record)
+
+    def add_phase(self, name, seconds, **counts):
+        with self.lock:
+            phase = self.phases.setdefault(name, {"calls": 0, "seconds": 0.0})
+            phase["calls"] += 1
+            phase["seconds"] += seconds
+            phase["peak_rss"] = peak_rss()
+            for key, value in counts.items():
+                phase[key] = phase.get(key, 0) + int(value)
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + int(value)
+
+    def as_dict(self):
+        with self.lock:
+            phases = {
+                name: {
+                    **phase,
+                    "files_per_second": throughput(phase, "files"),
+                    "bytes_per_second": throughput(phase, "bytes"),
+                }
+                for name, phase in self.phases.items()
+            }
+
+            # Every digest taken from the cache or a baseline saves opening and
+            # reading the file
+            reads_avoided = sum(
+                phase.get("cache_hits", 0) + phase.get("baseline_hits", 0)
+                for phase in self.phases.values()
+            )
+
+            return {
+                "phases": phases,
+                "counters": {**self.counters, "reads_avoided": reads_avoided},
+                "peak_rss": peak_rss(),
+            }
+
+    def to_json(self):
+        return json.dumps(self.as_dict(), indent=2)
+
+    def __str__(self):
+        stats = self.as_dict()
+        lines = [
+            f"{name:>20}  {phase['seconds']:10.3f} s  "
+            f"{phase.get('files', 0):10} files  "
+            f"{phase.get('bytes', 0) / 1024 ** 2:10.1f} MB  "
+            f"{phase['bytes_per_second'] / 1024 ** 2:8.1f} MB/s"
+            for name, phase in stats["phases"].items()
+        ]
+        lines += [f"{name:>20}  {value}" for name, value in stats["counters"].items()]
+        if stats["peak_rss"] is not None:
+            lines.append(f"{'peak_rss':>20}  {stats['peak_rss'] / 1024 ** 2:.1f} MB")
+        return "\n".join(lines)
+
+
+def timed(name):
+    # Times a method as a phase of the stats of its object
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.stats.phase(name):
+                return method(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def throughput(phase, key):
+    amount = phase.get(key, 0)
+    return amount / phase["seconds"] if phase["seconds"] > 0 else 0.0
@@ -1,25 +1,137 @@
+import concurrent.futures
 import datetime
 import hashlib
+import mmap
 import os
 import pathlib
+import stat
+import threading
 
-from .settings import CHUNK_SIZE
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+from .settings import (
+    BUFFER_SIZE,
+    CHUNK_SIZE,
+    COMPARE_CHUNK_SIZE,
+    HASH_ALGORITHM,
+    HASHLIB_ALGORITHMS,
+    MMAP_THRESHOLD,
+    XXHASH_ALGORITHMS,
+)
+
+# Executor classes are looked up on use, the process pool is slow to import
+EXECUTORS = {"thread": "ThreadPoolExecutor", "process": "ProcessPoolExecutor"}
+
+# Every thread reuses its own read buffer for full hashes
+_buffers = threading.local()
+
+
+def available_hash_algorithms():
+    if xxhash is None:
+        return list(HASHLIB_ALGORITHMS)
+    return list(HASHLIB_ALGORITHMS) + list(XXHASH_ALGORITHMS)
+
+
+def new_hasher(algorithm=HASH_ALGORITHM):
+    if algorithm not in available_hash_algorithms():
+        raise ValueError(
+            f"Unknown hash algorithm {algorithm}, "
+            f"choose one of {', '.join(available_hash_algorithms())}"
+        )
+
+    if algorithm in XXHASH_ALGORITHMS:
+        return getattr(xxhash, algorithm)()
+    return hashlib.new(algorithm)
 
 
 def extract_file_suffix(filename):
     return pathlib.Path(str(filename).lower()).suffix
 
 
-def hash_file(file_path, chunk_size=CHUNK_SIZE):
-    hasher = hashlib.md5()
+def hash_file(file_path, chunk_size=CHUNK_SIZE, algorithm=HASH_ALGORITHM):
+    hasher = new_hasher(algorithm)
     with open(file_path, "rb") as file:
         first_chunk = file.read(chunk_size)
         hasher.update(first_chunk)
         return hasher.hexdigest()
 
 
-def hash_text(text):
-    hasher = hashlib.md5()
+def hash_file_ends(file_path, chunk_size=CHUNK_SIZE, algorithm=HASH_ALGORITHM):
+    hasher = new_hasher(algorithm)
+    with open(file_path, "rb") as file:
+        hasher.update(file.read(chunk_size))
+        file.seek(max(os.fstat(file.fileno()).st_size - chunk_size, 0))
+        hasher.update(file.read(chunk_size))
+        return hasher.hexdigest()
+
+
+def hash_file_full(
+    file_path,
+    buffer_size=BUFFER_SIZE,
+    algorithm=HASH_ALGORITHM,
+    mmap_threshold=MMAP_THRESHOLD,
+    drop_cache=True,
+):
+    hasher = new_hasher(algorithm)
+    with open(file_path, "rb", buffering=0) as file:
+        size = os.fstat(file.fileno()).st_size
+        advise_sequential(file)
+
+        if mmap_threshold is not None and size >= max(mmap_threshold, 1):
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                with memoryview(mapped) as view:
+                    for start in range(0, size, buffer_size):
+                        hasher.update(view[start : start + buffer_size])
+        else:
+            buffer = get_buffer(buffer_size)
+            with memoryview(buffer) as view:
+                for length in iter(lambda: file.readinto(buffer), 0):
+                    hasher.update(view[:length])
+
+        # Files are read once, so they should not evict more useful pages
+        if drop_cache:
+            advise_dont_need(file)
+        return hasher.hexdigest()
+
+
+def get_buffer(buffer_size):
+    buffer = getattr(_buffers, "buffer", None)
+    if buffer is None or len(buffer) != buffer_size:
+        buffer = _buffers.buffer = bytearray(buffer_size)
+    return buffer
+
+
+def _advise(file, advice_name):
+    if hasattr(os, "posix_fadvise"):
+        try:
+            os.posix_fadvise(file.fileno(), 0, 0, getattr(os, advice_name))
+        except OSError:
+            pass
+
+
+def advise_sequential(file):
+    _advise(file, "POSIX_FADV_SEQUENTIAL")
+
+
+def advise_dont_need(file):
+    _advise(file, "POSIX_FADV_DONTNEED")
+
+
+def files_equal(first_path, second_path):
+    with open(first_path, "rb") as first, open(second_path, "rb") as second:
+        while True:
+            first_chunk = first.read(COMPARE_CHUNK_SIZE)
+            if first_chunk != second.read(COMPARE_CHUNK_SIZE):
+                return False
+            if not first_chunk:
+                return True
+
+
+def hash_text(text, algorithm=HASH_ALGORITHM):
+    hasher = new_hasher(algorithm)
     hasher.update(str.encode(text))
     return hasher.hexdigest()
 
@@ -28,9 +140,120 @@ def get_size(file_path):
     return os.path.getsize(file_path)
 
 
+def iter_directory(path):
+    directories = [pathlib.Path(path)]
+    while directories:
+        parent = directories.pop()
+
+        try:
+            entries = os.scandir(parent)
+        except OSError:
+            continue
+
+        with entries:
+            for entry in entries:
+                try:
+                    stat_result = entry.stat()
+                except OSError:
+                    continue
+
+                if stat.S_ISDIR(stat_result.st_mode):
+                    # Symbolic links to directories are listed but not followed
+                    if not entry.is_symlink():
+                        directories.append(parent / entry.name)
+                elif not stat.S_ISREG(stat_result.st_mode):
+                    continue
+
+                try:
+                    identity = entry_identity(entry)
+                except OSError:
+                    continue
+
+                yield parent, entry.name, stat_result, identity
+
+
+def entry_identity(entry):
+    # Hard links share their device and inode. Symbolic links are told apart from
+    # their targets by their own inode and Windows only fills in both on os.stat().
+    stat_result = entry.stat(follow_symlinks=False)
+    if not stat_result.st_ino:
+        stat_result = os.stat(entry.path, follow_symlinks=False)
+    return stat_result.st_dev, stat_result.st_ino, stat.S_ISLNK(stat_result.st_mode)
+
+
+def link_key(device, inode, default):
+    # Without an inode no two entries can be known to be links of the same file
+    return (device, inode) if inode else default
+
+
+def scan_directory(path):
+    return entry_columns(iter_directory(path))
+
+
+def entry_columns(entries):
+    columns = {
+        "path": [],
+        "name": [],
+        "parent": [],
+        "parent_name": [],
+        "suffix": [],
+        "size": [],
+        "is_file": [],
+        "is_dir": [],
+        "device": [],
+        "inode": [],
+        "mtime": [],
+        "is_symlink": [],
+    }
+
+    for parent, name, stat_result, (device, inode, is_symlink) in entries:
+        is_file = stat.S_ISREG(stat_result.st_mode)
+
+        columns["path"].append(parent / name)
+        columns["name"].append(name)
+        columns["parent"].append(parent)
+        columns["parent_name"].append(parent.name)
+        columns["suffix"].append(extract_file_suffix(name) if is_file else None)
+        columns["size"].append(stat_result.st_size)
+        columns["is_file"].append(is_file)
+        columns["is_dir"].append(not is_file)
+        columns["device"].append(device)
+        columns["inode"].append(inode)
+        columns["mtime"].append(stat_result.st_mtime_ns)
+        columns["is_symlink"].append(is_symlink)
+
+    return columns
+
+
 def extract_parent(path):
     return pathlib.Path(path).parent
 
 
 def get_number_of_files_in_directory(path):
     return len(os.listdir(pathlib.Path(path)))
+
+
+def map_files(function, file_paths, jobs=1, executor="thread", callback=None):
+    file_paths = list(file_paths)
+    jobs = jobs or os.cpu_count()
+
+    if jobs == 1 or len(file_paths) < 2:
+        return _collect(map(function, file_paths), callback)
+
+    # Results keep the order of the input regardless of which worker finishes first
+    chunksize = max(len(file_paths) // (4 * jobs), 1)
+    pool_class = getattr(concurrent.futures, EXECUTORS[executor])
+    with pool_class(max_workers=jobs) as pool:
+        return _collect(pool.map(function, file_paths, chunksize=chunksize), callback)
+
+
+def _collect(results, callback=None):
+    # The callback always runs in the calling thread, once per finished file
+    if callback is None:
+        return list(results)
+
+    collected = []
+    for result in results:
+        collected.append(result)
+        callback(result)
+    return collected
@@ -0,0 +1,143 @@
+import functools
+
+from .settings import (
+    BUFFER_SIZE,
+    CHUNK_SIZE,
+    HASH_ALGORITHM,
+    VERIFY_BUFFER_LIMIT,
+    VERIFY_MAX_OPEN_FILES,
+)
+from .utils import map_files, new_hasher
+
+# Candidate files are read side by side and compared chunk by chunk. A group is
+# split as soon as its files differ and files without a partner are not read any
+# further, so differing files are usually only read up to their first difference.
+# Files found to be equal are hashed on the way, with a single hash per group.
+
+
+def verify_group(
+    paths,
+    algorithm=HASH_ALGORITHM,
+    buffer_size=BUFFER_SIZE,
+    max_open_files=VERIFY_MAX_OPEN_FILES,
+):
+    confirmed = []
+    bytes_read = 0
+
+    # Every pending group shares all bytes before its offset
+    pending = [(list(paths), 0, new_hasher(algorithm))]
+    while pending:
+        members, offset, hasher = pending.pop()
+
+        # Larger groups reopen their files for every chunk, so that the number of
+        # open files never exceeds the limit
+        keep_open = len(members) <= max_open_files
+        files = {}
+        try:
+            if keep_open:
+                for path in members:
+                    files[path] = open_at(path, offset)
+
+            chunk_size = CHUNK_SIZE
+            while True:
+                # Chunks grow once files agree, but the chunks of all members of a
+                # group together stay within the buffer limit
+                size = min(
+                    chunk_size, max(CHUNK_SIZE, VERIFY_BUFFER_LIMIT // len(members))
+                )
+                chunks = {}
+                for path in members:
+                    if keep_open:
+                        chunk = read_open(files[path], size)
+                    else:
+                        chunk = read_chunk(path, offset, size)
+
+                    # Files that cannot be read are never confirmed
+                    if chunk is not None:
+                        chunks.setdefault(chunk, []).append(path)
+                        bytes_read += len(chunk)
+
+                if len(chunks) == 1 and len(next(iter(chunks.values()))) > 1:
+                    chunk = next(iter(chunks))
+                    members = chunks[chunk]
+                    if not chunk:
+                        confirmed.append((sorted(members), hasher.hexdigest()))
+                        break
+
+                    hasher.update(chunk)
+                    offset += len(chunk)
+                    chunk_size = min(2 * chunk_size, buffer_size)
+                    continue
+
+                for chunk, subgroup in chunks.items():
+                    if len(subgroup) > 1:
+                        subgroup_hasher = hasher.copy()
+                        subgroup_hasher.update(chunk)
+                        pending.append((subgroup, offset + len(chunk), subgroup_hasher))
+                break
+        finally:
+            for file in files.values():
+                if file is not None:
+                    file.close()
+
+    return confirmed, bytes_read
+
+
+def open_at(path, offset):
+    try:
+        file = open(path, "rb")
+        file.seek(offset)
+        return file
+    except OSError:
+        return None
+
+
+def read_open(file, size):
+    if file is None:
+        return None
+    try:
+        return file.read(size)
+    except OSError:
+        return None
+
+
+def read_chunk(path, offset, size):
+    try:
+        with open(path, "rb") as file:
+            file.seek(offset)
+            return file.read(size)
+    except OSError:
+        return None
+
+
+def verify_groups(
+    groups,
+    jobs=1,
+    executor="thread",
+    algorithm=HASH_ALGORITHM,
+    buffer_size=BUFFER_SIZE,
+    max_open_files=VERIFY_MAX_OPEN_FILES,
+    phase=None,
+):
+    phase = {} if phase is None else phase
+
+    # Every worker gets its share of the open files
+    results = map_files(
+        functools.partial(
+            verify_group,
+            algorithm=algorithm,
+            buffer_size=buffer_size,
+            max_open_files=max(max_open_files // max(jobs, 1), 2),
+        ),
+        groups,
+        jobs,
+        executor,
+    )
+
+    confirmed = []
+    for group_confirmed, bytes_read in results:
+        confirmed.extend(group_confirmed)
+        phase["bytes"] = phase.get("bytes", 0) + bytes_read
+    phase["files"] = phase.get("files", 0) + sum(len(group) for group in groups)
+
+    return confirmed
@@ -27,6 +27,7 @@ setup(
     author="Peter Stein",
     license="MIT",
     packages=["sauber"],
-    install_requires=["pandas"],
+    install_requires=["numpy"],
+    extras_require={"pandas": ["pandas"], "images": ["Pillow"]},
     entry_points={"console_scripts": ["sauber=sauber.__main__:main"]},
 )
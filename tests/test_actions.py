@@ -0,0 +1,117 @@
+import json
+import os
+
+import pytest
+
+from sauber.actions import apply_action, choose_keeper, plan_actions
+from sauber.core import FileHashChecker
+
+
+def create_copies(tmp_path):
+    for directory in ["kept", "copies/nested"]:
+        (tmp_path / directory).mkdir(parents=True)
+
+    paths = [
+        tmp_path / "kept" / "a",
+        tmp_path / "copies" / "a",
+        tmp_path / "copies" / "nested" / "a",
+    ]
+    for age, path in enumerate(paths):
+        path.write_bytes(b"a" * 10000)
+        os.utime(path, ns=(age * 10 ** 9, (3 - age) * 10 ** 9))
+    (tmp_path / "kept" / "unique").write_bytes(b"b" * 20000)
+    return paths
+
+
+def test_choose_keeper(tmp_path):
+    group = [
+        {"path": tmp_path / "a" / "long name", "size": 1, "mtime": 1},
+        {"path": tmp_path / "b" / "short", "size": 1, "mtime": 3},
+        {"path": tmp_path / "c" / "old", "size": 1, "mtime": 0},
+    ]
+
+    assert choose_keeper(group)["path"] == tmp_path / "c" / "old"
+    assert choose_keeper(group, "oldest")["path"] == tmp_path / "c" / "old"
+    assert (
+        choose_keeper(group, "root", [tmp_path / "d", tmp_path / "a"])["path"]
+        == tmp_path / "a" / "long name"
+    )
+    assert choose_keeper(group, "root", [tmp_path / "d"])["path"] == (
+        tmp_path / "c" / "old"
+    )
+    with pytest.raises(ValueError):
+        choose_keeper(group, "newest")
+
+    assert plan_actions([group], "oldest") == [
+        (tmp_path / "c" / "old", tmp_path / "a" / "long name", 1),
+        (tmp_path / "c" / "old", tmp_path / "b" / "short", 1),
+    ]
+
+
+def test_apply_action_checks_copies(tmp_path):
+    keeper, copy, changed = create_copies(tmp_path)
+    changed.write_bytes(b"c" * 10000)
+    os.link(keeper, tmp_path / "link")
+
+    assert apply_action("delete", keeper, changed, 10000)["reason"] == (
+        "content changed"
+    )
+    assert apply_action("delete", keeper, copy, 5000)["reason"] == "size changed"
+    assert apply_action("delete", keeper, tmp_path / "link", 10000)["reason"] == (
+        "already linked"
+    )
+    assert apply_action("delete", keeper, tmp_path / "missing", 10000)["status"] == (
+        "failed"
+    )
+    assert changed.exists() and copy.exists()
+
+
+@pytest.mark.parametrize("action", ["hardlink", "delete"])
+def test_deduplicate(tmp_path, action):
+    keeper, *copies = create_copies(tmp_path)
+    checker = FileHashChecker()
+    checker.iterate(tmp_path)
+
+    summary, records = checker.deduplicate(
+        action, keep="oldest", dry_run=True, journal=tmp_path / "journal"
+    )
+    assert summary["planned"] == 2
+    assert {record["keeper"] for record in records} == {str(copies[-1])}
+    assert summary["bytes_reclaimed"] == 20000
+    assert all(copy.stat().st_nlink == 1 for copy in copies)
+
+    summary, records = checker.deduplicate(
+        action, keep="root", roots=[tmp_path / "kept"], journal=tmp_path / "journal"
+    )
+    assert summary["done"] == 2
+    assert summary["bytes_reclaimed"] == 20000
+    assert {record["path"] for record in records} == {str(copy) for copy in copies}
+    assert all(record["verified"] for record in records)
+
+    for copy in copies:
+        if action == "delete":
+            assert not copy.exists()
+        else:
+            assert os.path.samefile(copy, keeper)
+    assert keeper.read_bytes() == b"a" * 10000
+    assert not list(tmp_path.glob("**/*.sauber-tmp"))
+
+    lines = [json.loads(line) for line in open(tmp_path / "journal")]
+    statuses = ["started", "started", "planned", "planned"]
+    statuses += ["started", "started", "done", "done"]
+    assert [line["status"] for line in lines] == statuses
+    assert [line["dry_run"] for line in lines] == [True] * 4 + [False] * 4
+
+
+def test_deduplicate_reflink(tmp_path):
+    keeper, *copies = create_copies(tmp_path)
+    checker = FileHashChecker()
+    checker.iterate(tmp_path)
+
+    summary, records = checker.deduplicate("reflink", batch_size=1, jobs=2)
+
+    # Filesystems without reflinks keep every copy as it is
+    assert summary["done"] + summary["failed"] == 2
+    for copy in copies:
+        assert copy.read_bytes() == b"a" * 10000
+    assert not list(tmp_path.glob("**/*.sauber-tmp"))
@@ -0,0 +1,129 @@
+import struct
+
+from sauber.audio import audio_ranges, audio_size, hash_audio
+from sauber.core import FileHashChecker
+
+AUDIO = bytes(range(256)) * 40
+OTHER_AUDIO = bytes(reversed(range(256))) * 40
+
+
+def id3v2(title, footer=False):
+    frame = b"TIT2" + struct.pack(">I", len(title) + 1) + b"\x00\x00\x00" + title
+    # Tag sizes are syncsafe integers with seven bits per byte
+    size = bytes((len(frame) >> shift) & 0x7F for shift in [21, 14, 7, 0])
+    header = b"ID3\x04\x00" + (b"\x10" if footer else b"\x00") + size
+    return header + frame + (b"3DI" + header[3:] if footer else b"")
+
+
+def id3v1(title):
+    return b"TAG" + title.ljust(125, b"\x00")
+
+
+def ape(title):
+    item = struct.pack("<II", len(title), 0) + b"Title\x00" + title
+    size = len(item) + 32
+    header = b"APETAGEX" + struct.pack("<IIII", 2000, size, 1, 0xA0000000) + bytes(8)
+    footer = b"APETAGEX" + struct.pack("<IIII", 2000, size, 1, 0x80000000) + bytes(8)
+    return header + item + footer
+
+
+def flac(audio, comment):
+    stream_info = b"\x00" + (34).to_bytes(3, "big") + bytes(34)
+    vorbis_comment = b"\x84" + len(comment).to_bytes(3, "big") + comment
+    return b"fLaC" + stream_info + vorbis_comment + audio
+
+
+def box(box_type, content):
+    return struct.pack(">I4s", len(content) + 8, box_type) + content
+
+
+def mp4(audio, title, audio_first=False):
+    ftyp = box(b"ftyp", b"M4A \x00\x00\x00\x00")
+    moov = box(b"moov", box(b"udta", box(b"\xa9nam", title)))
+    mdat = box(b"mdat", audio)
+    return ftyp + (mdat + moov if audio_first else moov + mdat)
+
+
+def wav(audio, info):
+    fmt = b"fmt " + struct.pack("<I", 16) + bytes(16)
+    padding = b"\x00" if len(info) % 2 else b""
+    chunks = fmt + b"LIST" + struct.pack("<I", len(info)) + info + padding
+    chunks += b"data" + struct.pack("<I", len(audio)) + audio
+    return b"RIFF" + struct.pack("<I", len(chunks) + 4) + b"WAVE" + chunks
+
+
+def test_audio_ranges(tmp_path):
+    tagged = id3v2(b"Title", footer=True) + AUDIO + ape(b"Title") + id3v1(b"Title")
+    (tmp_path / "tagged.mp3").write_bytes(tagged)
+    (tmp_path / "plain.mp3").write_bytes(AUDIO)
+
+    start = len(id3v2(b"Title", footer=True))
+    assert audio_ranges(tmp_path / "tagged.mp3") == [(start, start + len(AUDIO))]
+    assert audio_ranges(tmp_path / "plain.mp3") == [(0, len(AUDIO))]
+    assert audio_size(tmp_path / "tagged.mp3") == len(AUDIO)
+
+
+def test_hash_audio_ignores_tags(tmp_path):
+    variants = {
+        "mp3": [
+            id3v2(b"Title") + AUDIO + id3v1(b"Title"),
+            id3v2(b"Another title", footer=True) + AUDIO + ape(b"Another title"),
+            AUDIO,
+        ],
+        "flac": [flac(AUDIO, b"title=Title"), flac(AUDIO, b"title=Another title")],
+        "m4a": [mp4(AUDIO, b"Title"), mp4(AUDIO, b"Another", audio_first=True)],
+        "wav": [wav(AUDIO, b"INFO"), wav(AUDIO, b"INFO with a title")],
+    }
+
+    for suffix, contents in variants.items():
+        digests = set()
+        for number, content in enumerate(contents):
+            path = tmp_path / f"{number}.{suffix}"
+            path.write_bytes(content)
+            digests.add(hash_audio(path, buffer_size=1000))
+
+        assert len(digests) == 1
+
+    (tmp_path / "other.mp3").write_bytes(id3v2(b"Title") + OTHER_AUDIO)
+    assert hash_audio(tmp_path / "other.mp3") != hash_audio(tmp_path / "2.mp3")
+
+
+def test_same_audio(tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "a" / "Track.mp3").write_bytes(id3v2(b"Track") + AUDIO)
+    (tmp_path / "a" / "Other.mp3").write_bytes(id3v2(b"Other") + OTHER_AUDIO)
+    (tmp_path / "a" / "Track.txt").write_bytes(AUDIO)
+    (tmp_path / "b").mkdir()
+    (tmp_path / "b" / "Track (copy).mp3").write_bytes(
+        id3v2(b"Track (copy)") + AUDIO + id3v1(b"Track (copy)")
+    )
+    (tmp_path / "b" / "Track.flac").write_bytes(flac(AUDIO[:-1], b"title=Track"))
+    (tmp_path / "b" / "Empty.wav").write_bytes(wav(b"", b"INFO"))
+    (tmp_path / "b" / "Silence.wav").write_bytes(wav(b"", b"ISFT"))
+
+    checker = FileHashChecker()
+    checker.iterate(tmp_path)
+
+    assert checker.duplicate_music.empty
+    assert checker.same_audio() == [
+        [tmp_path / "a" / "Track.mp3", tmp_path / "b" / "Track (copy).mp3"]
+    ]
+    assert checker.stats.phases["hash_audio"]["files"] == 3
+
+
+def test_same_audio_of_broken_files(tmp_path):
+    truncated = box(b"ftyp", b"M4A \x00\x00\x00\x00") + struct.pack(">I4s", 1, b"mdat")
+    (tmp_path / "truncated.m4a").write_bytes(truncated + b"\x00\x00")
+    (tmp_path / "truncated.wav").write_bytes(wav(AUDIO, b"INFO")[:40] + b"da")
+    (tmp_path / "truncated.flac").write_bytes(flac(AUDIO, b"")[:40])
+    (tmp_path / "Track.mp3").write_bytes(AUDIO)
+    (tmp_path / "Deleted.mp3").write_bytes(AUDIO)
+    assert audio_ranges(tmp_path / "truncated.m4a") == []
+    assert audio_size(tmp_path / "truncated.wav") == 0
+
+    checker = FileHashChecker()
+    checker.iterate(tmp_path)
+    (tmp_path / "Deleted.mp3").unlink()
+
+    assert checker.same_audio() == []
+    assert audio_size(tmp_path / "Deleted.mp3") == 0
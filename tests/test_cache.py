@@ -0,0 +1,80 @@
+from sauber.cache import HashCache
+from sauber.core import FileHashChecker
+
+
+def test_get_and_set(tmp_path):
+    with HashCache(tmp_path / "cache.sqlite") as cache:
+        assert cache.get_many([(1, 2, 3, 4)], "full") == [None]
+
+        cache.set_many([((1, 2, 3, 4), "digest")], "full")
+        assert cache.get_many([(1, 2, 3, 4), (1, 2, 3, 5)], "full") == [
+            "digest",
+            None,
+        ]
+        assert cache.get_many([(1, 2, 3, 4)], "head") == [None]
+
+        assert cache.hits == 1
+        assert cache.misses == 3
+
+    with HashCache(tmp_path / "cache.sqlite") as cache:
+        assert cache.get_many([(1, 2, 3, 4)], "full") == ["digest"], "Persistent"
+
+
+def test_eviction(tmp_path):
+    with HashCache(tmp_path / "cache.sqlite", max_entries=2) as cache:
+        cache.set_many([((1, 1, 1, 1), "a")], "full")
+        cache.set_many([((2, 2, 2, 2), "b")], "full")
+        cache.get_many([(1, 1, 1, 1)], "full")
+        cache.set_many([((3, 3, 3, 3), "c")], "full")
+
+        assert len(cache) == 2
+        assert cache.get_many([(1, 1, 1, 1), (2, 2, 2, 2)], "full") == ["a", None]
+
+
+def test_large_devices_and_inodes(tmp_path):
+    # Network and overlay filesystems report values beyond SQLite's signed integers
+    key = (2 ** 64 - 1, 2 ** 63, 3, -4)
+    with HashCache(tmp_path / "cache.sqlite") as cache:
+        cache.set_many([(key, "digest")], "full")
+        assert cache.get_many([key, (2 ** 63 - 1, 2 ** 63, 3, -4)], "full") == [
+            "digest",
+            None,
+        ]
+        assert cache.entries == 1
+
+def test_entry_count(tmp_path):
+    with HashCache(tmp_path / "cache.sqlite", max_entries=300) as cache:
+        cache.set_many([((number, 1, 1, 1), "a") for number in range(250)], "full")
+        cache.set_many([((number, 1, 1, 1), "b") for number in range(200, 350)], "full")
+
+        assert cache.entries == len(cache) == 300
+        assert cache.get_many([(0, 1, 1, 1), (349, 1, 1, 1)], "full") == [None, "b"]
+
+    with HashCache(tmp_path / "cache.sqlite", max_entries=300) as cache:
+        assert cache.entries == 300
+
+
+def test_no_cache_without_inodes(tmp_path, monkeypatch):
+    monkeypatch.setattr("sauber.utils.entry_identity", lambda entry: (0, 0, False))
+    with HashCache(tmp_path / "cache.sqlite") as cache:
+        checker = FileHashChecker(cache=cache)
+        checker.iterate("test_data/files/")
+
+        assert len(cache) == 0
+        assert cache.hits == cache.misses == 0
+
+
+def test_cached_iterate(tmp_path):
+    with HashCache(tmp_path / "cache.sqlite") as cache:
+        checker = FileHashChecker(cache=cache)
+        checker.iterate("test_data/files/")
+        assert cache.hits == 0
+        assert cache.misses > 0
+
+        misses = cache.misses
+        cached_checker = FileHashChecker(cache=cache)
+        cached_checker.iterate("test_data/files/")
+        assert cache.hits == misses
+        assert cache.misses == misses
+
+    assert checker.df.equals(cached_checker.df)
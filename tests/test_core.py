@@ -1,8 +1,15 @@
+import json
+import os
 import pathlib
+import subprocess
+import sys
 
 import pandas
+import pytest
 
 from sauber.core import FileHashChecker
+from sauber.settings import HASH_STAGE_NONE, NOT_HASHED
+from sauber.utils import map_files
 
 
 def setup():
@@ -57,27 +64,62 @@ def test_duplicate_documents():
     assert filenames == {
         "document (original).pdf",
         "document (copy).pdf",
-        "document (recreated).pdf",
         "lorem_ipsum_1000.txt",
     }
 
     assert "document (slightly different).pdf" not in filenames
-    assert len(checker.duplicate_documents) == 6
+    assert "document (recreated).pdf" not in filenames, "Differs after the header"
+    assert len(checker.duplicate_documents) == 5
 
 
-def test_export_import_data():
+def test_export_import_data(tmp_path):
     checker = FileHashChecker()
     checker.iterate("test_data/files/")
-    checker.export_data("test_data/data.csv")
+    checker.export_data(tmp_path / "data.csv")
     assert len(checker.files) == 21
 
     checker2 = FileHashChecker()
     assert len(checker2.files) == 0
 
-    checker2.import_data("test_data/data.csv")
+    checker2.import_data(tmp_path / "data.csv")
     assert len(checker2.files) == len(checker.files)
 
 
+def test_export_import_snapshot(tmp_path):
+    (tmp_path / "tree").mkdir()
+    (tmp_path / "tree" / "one").write_bytes(b"aa")
+    (tmp_path / "tree" / "two").write_bytes(b"aa")
+
+    checker = FileHashChecker()
+    checker.iterate(tmp_path / "tree")
+    checker.export_data(tmp_path / "data.sauber")
+
+    (tmp_path / "tree" / "two").write_bytes(b"ab")
+    imported = FileHashChecker()
+    imported.iterate(tmp_path / "tree")
+    assert not imported.df.is_duplicate.any()
+
+    imported.import_data(tmp_path / "data.sauber")
+
+    assert imported.df.index.is_unique
+    assert isinstance(imported.df.index[0], pathlib.Path)
+    assert imported.df.is_duplicate.dtype == bool
+    pandas.testing.assert_frame_equal(imported.df, checker.df)
+
+
+def test_import_csv_types(tmp_path):
+    checker = FileHashChecker()
+    checker.iterate("test_data/files2/")
+    checker.export_data(tmp_path / "data.csv")
+
+    imported = FileHashChecker()
+    imported.import_data(tmp_path / "data.csv")
+
+    assert isinstance(imported.df.index[0], pathlib.Path)
+    assert isinstance(imported.df.parent.iloc[0], pathlib.Path)
+    assert imported.df.is_file.dtype == bool
+
+
 def test_duplicates():
     checker = FileHashChecker()
     checker.iterate("test_data/files/")
@@ -92,7 +134,6 @@ def test_duplicates():
         "test_data/files/duplicates/jpeg/clouds.jpg",
         "test_data/files/duplicates/jpeg/curved_road.jpg",
         "test_data/files/duplicates/pdf/document (original).pdf",
-        "test_data/files/duplicates/pdf/document (recreated).pdf",
         "test_data/files/duplicates/txt/lorem_ipsum_1000.txt",
         "test_data/files/duplicates/mp3/Right_Here_Beside_You.mp3",
         "test_data/files/partial duplicates/jpeg/clouds.jpg",
@@ -106,6 +147,7 @@ def test_duplicates():
         "test_data/files/base/jpeg/asphalt.jpg",
         "test_data/files/partial duplicates/jpeg/roses.jpg",
         "test_data/files/duplicates/pdf/document (slightly different).pdf",
+        "test_data/files/duplicates/pdf/document (recreated).pdf",
         "test_data/files/partial duplicates/txt/lorem_ipsum_999.txt",
     ]
 
@@ -174,8 +216,9 @@ def test_directory_hashes():
 
     assert (
         checker.df.loc[pathlib.Path("test_data/files2/A"), "hash"]
-        == "a8f963f199e83660cd8ff21ac94d440a"
-    )
+        == "61cd080687679c7ca0a8df746b78543b"
+    ), "Hash of the sorted hash and size pairs of a1.txt, a2.txt and a3.txt"
+    assert checker.df.loc[pathlib.Path("test_data/files2/Subfolder"), "size"] == 12
     assert (
         checker.df.loc[pathlib.Path("test_data/files2/Subfolder/A"), "hash"]
         == checker.df.loc[pathlib.Path("test_data/files2/A"), "hash"]
@@ -233,3 +276,484 @@ def test_find():
 
     images = checker.find_images
     assert images.suffix.unique() == [".jpg"]
+
+
+def test_unique_sizes_are_not_hashed():
+    checker = FileHashChecker()
+    checker.iterate("test_data/files/")
+
+    for path in [
+        "test_data/files/base/jpeg/asphalt.jpg",
+        "test_data/files/partial duplicates/jpeg/roses.jpg",
+        "test_data/files/partial duplicates/txt/lorem_ipsum_999.txt",
+    ]:
+        assert checker.df.loc[pathlib.Path(path), "hash"] == NOT_HASHED
+        assert not checker.df.loc[pathlib.Path(path), "is_duplicate"]
+
+    assert (
+        checker.df.loc[pathlib.Path("test_data/files/base/jpeg/clouds.jpg"), "hash"]
+        != NOT_HASHED
+    )
+
+
+def test_unhashed_files_in_directory_hashes(tmp_path):
+    (tmp_path / "one").mkdir()
+    (tmp_path / "one" / "file").write_text("a")
+    (tmp_path / "two").mkdir()
+    (tmp_path / "two" / "file").write_text("bb")
+
+    checker = FileHashChecker()
+    checker.iterate(tmp_path)
+
+    assert (checker.files.hash == NOT_HASHED).all()
+    assert checker.duplicates.empty
+
+
+def test_hash_stages(tmp_path):
+    (tmp_path / "plain").write_bytes(b"a" * 10000)
+    (tmp_path / "head").write_bytes(b"b" + b"a" * 9999)
+    (tmp_path / "tail").write_bytes(b"a" * 9999 + b"b")
+    (tmp_path / "middle").write_bytes(b"a" * 5000 + b"b" + b"a" * 4999)
+    (tmp_path / "copy").write_bytes(b"a" * 5000 + b"b" + b"a" * 4999)
+    (tmp_path / "small").write_bytes(b"a")
+    (tmp_path / "small_copy").write_bytes(b"a")
+
+    checker = FileHashChecker()
+    checker.iterate(tmp_path)
+    stages = checker.files.set_index("name").hash_stage.to_dict()
+
+    assert stages == {
+        "plain": "full",
+        "head": "head",
+        "tail": "tail",
+        "middle": "full",
+        "copy": "full",
+        "small": "full",
+        "small_copy": "full",
+    }
+    assert set(checker.duplicate_files.name) == {
+        "middle",
+        "copy",
+        "small",
+        "small_copy",
+    }
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_parallel_hashing(executor):
+    serial = FileHashChecker()
+    serial.iterate("test_data/files/")
+
+    parallel = FileHashChecker()
+    parallel.iterate("test_data/files/", jobs=4, executor=executor)
+
+    pandas.testing.assert_frame_equal(serial.df, parallel.df)
+
+
+def test_incremental_iterate(tmp_path, monkeypatch, capsys):
+    for folder in ["one", "two", "three", "three/deep"]:
+        (tmp_path / folder).mkdir()
+        (tmp_path / folder / "same").write_text("same content")
+        (tmp_path / folder / "changing").write_text("original")
+    (tmp_path / "one" / "deleted").write_text("deleted")
+    (tmp_path / "two" / "deleted").write_text("deleted")
+    (tmp_path / "three" / "deleted").write_text("deleted")
+
+    baseline = FileHashChecker()
+    baseline.iterate(tmp_path)
+
+    (tmp_path / "one" / "deleted").unlink()
+    (tmp_path / "three" / "deep" / "changing").write_text("modified")
+    (tmp_path / "new").mkdir()
+    (tmp_path / "new" / "same").write_text("same content")
+
+    hashed_paths = []
+
+    def recording_map_files(function, file_paths, *args):
+        file_paths = list(file_paths)
+        hashed_paths.extend(file_paths)
+        return map_files(function, file_paths, *args)
+
+    monkeypatch.setattr("sauber.core.map_files", recording_map_files)
+
+    incremental = FileHashChecker()
+    incremental.iterate(tmp_path, debug=True, baseline=baseline)
+    hashed = set(hashed_paths)
+
+    monkeypatch.undo()
+    assert "Reusing hashes of 1 unchanged directories" in capsys.readouterr().out
+
+    full = FileHashChecker()
+    full.iterate(tmp_path)
+
+    assert hashed == {
+        tmp_path / "new" / "same",
+        tmp_path / "three" / "deep" / "changing",
+    }
+    assert tmp_path / "one" / "deleted" not in incremental.df.index
+    pandas.testing.assert_frame_equal(
+        incremental.df[["hash", "hash_stage", "is_duplicate"]],
+        full.df[["hash", "hash_stage", "is_duplicate"]],
+    )
+
+
+def test_incremental_iterate_from_snapshot(tmp_path):
+    checker = FileHashChecker()
+    checker.iterate("test_data/files2/")
+    checker.export_data(tmp_path / "data.csv")
+
+    snapshot = FileHashChecker()
+    snapshot.import_data(tmp_path / "data.csv")
+
+    incremental = FileHashChecker()
+    incremental.iterate("test_data/files2/", baseline=snapshot)
+
+    pandas.testing.assert_frame_equal(
+        incremental.df[["hash", "is_duplicate"]], checker.df[["hash", "is_duplicate"]]
+    )
+
+
+@pytest.mark.parametrize("snapshot", [False, True])
+def test_incremental_iterate_large_files(tmp_path, snapshot):
+    (tmp_path / "tree").mkdir()
+    content = bytearray(b"a" * 100000)
+    (tmp_path / "tree" / "one").write_bytes(content)
+    (tmp_path / "tree" / "two").write_bytes(content)
+    content[-1] = ord("b")
+    (tmp_path / "tree" / "tail").write_bytes(content)
+
+    baseline = FileHashChecker()
+    baseline.iterate(tmp_path / "tree")
+    if snapshot:
+        baseline.export_data(tmp_path / "data.sauber")
+        baseline = FileHashChecker()
+        baseline.import_data(tmp_path / "data.sauber")
+
+    # Unchanged files are never read again, not even their head or tail
+    incremental = FileHashChecker()
+    incremental.iterate(tmp_path / "tree", baseline=baseline)
+    for stage, hits in [("hash_head", 3), ("hash_tail", 3), ("hash_full", 2)]:
+        assert incremental.stats.phases[stage]["files"] == 0
+        assert incremental.stats.phases[stage]["baseline_hits"] == hits
+    pandas.testing.assert_frame_equal(
+        incremental.df[["hash", "hash_stage", "head_hash", "tail_hash"]],
+        baseline.df[["hash", "hash_stage", "head_hash", "tail_hash"]],
+    )
+
+
+def test_directory_hashes_ignore_names(tmp_path):
+    for folder, names in [("one", ["a", "b"]), ("two", ["c", "d"])]:
+        (tmp_path / folder / "deep" / "path").mkdir(parents=True)
+        (tmp_path / folder / "deep" / "path" / names[0]).write_text("first")
+        (tmp_path / folder / "deep" / names[1]).write_text("second")
+
+    checker = FileHashChecker()
+    checker.iterate(tmp_path)
+
+    assert set(checker.duplicate_directories.index) == {
+        tmp_path / folder / path
+        for folder in ["one", "two"]
+        for path in ["", "deep", "deep/path"]
+    }
+    assert checker.df.loc[tmp_path / "one", "size"] == len("first" + "second")
+
+
+@pytest.mark.parametrize("batch_size", [1, 1000])
+def test_iter_duplicate_groups(batch_size):
+    checker = FileHashChecker()
+    groups = list(
+        checker.iter_duplicate_groups("test_data/files/", batch_size=batch_size)
+    )
+
+    full_checker = FileHashChecker()
+    full_checker.iterate("test_data/files/")
+    expected_groups = [
+        sorted(group_df.index)
+        for _, group_df in full_checker.duplicate_files.groupby(["size", "hash"])
+    ]
+
+    assert sorted(groups) == sorted(expected_groups)
+    assert checker.df.empty, "Streaming does not build the index"
+
+
+@pytest.mark.parametrize("hash_algorithm", ["sha1", "blake2b", "blake2s"])
+def test_hash_algorithms(hash_algorithm):
+    md5_checker = FileHashChecker()
+    md5_checker.iterate("test_data/files/")
+
+    checker = FileHashChecker(hash_algorithm=hash_algorithm)
+    checker.iterate("test_data/files/")
+
+    pandas.testing.assert_series_equal(
+        checker.df.is_duplicate, md5_checker.df.is_duplicate
+    )
+    assert (checker.files.hash != md5_checker.files.hash).any()
+
+
+def test_unknown_hash_algorithm():
+    with pytest.raises(ValueError):
+        FileHashChecker(hash_algorithm="unknown")
+
+
+@pytest.mark.parametrize("buffer_size", [0, -1])
+def test_invalid_buffer_size(buffer_size):
+    with pytest.raises(ValueError):
+        FileHashChecker(buffer_size=buffer_size)
+
+
+def test_mixed_hash_algorithms(tmp_path):
+    checker = FileHashChecker(hash_algorithm="blake2b")
+    checker.iterate("test_data/files2/")
+    checker.export_data(tmp_path / "data.csv")
+
+    with pytest.raises(ValueError):
+        FileHashChecker().import_data(tmp_path / "data.csv")
+
+    with pytest.raises(ValueError):
+        FileHashChecker().iterate("test_data/files2/", baseline=checker)
+    for baseline in [checker.df, checker.entries]:
+        with pytest.raises(ValueError):
+            FileHashChecker().iterate("test_data/files2/", baseline=baseline)
+        with pytest.raises(ValueError):
+            FileHashChecker().iterate(
+                "test_data/files2/", baseline=baseline, baseline_algorithm="blake2b"
+            )
+        FileHashChecker(hash_algorithm="blake2b").iterate(
+            "test_data/files2/", baseline=baseline, baseline_algorithm="blake2b"
+        )
+    with pytest.raises(ValueError):
+        FileHashChecker().iterate("test_data/files2/", baseline=checker.compact())
+
+    imported = FileHashChecker(hash_algorithm="blake2b")
+    imported.import_data(tmp_path / "data.csv")
+    assert "hash_algorithm" not in imported.df
+
+
+def test_hard_links(tmp_path, monkeypatch):
+    (tmp_path / "original").write_bytes(b"a" * 10000)
+    os.link(tmp_path / "original", tmp_path / "link")
+    (tmp_path / "copy").write_bytes(b"a" * 10000)
+    (tmp_path / "other").write_bytes(b"b" * 20000)
+    os.link(tmp_path / "other", tmp_path / "other_link")
+
+    hashed_paths = []
+
+    def recording_map_files(function, file_paths, *args):
+        file_paths = list(file_paths)
+        hashed_paths.extend(file_paths)
+        return map_files(function, file_paths, *args)
+
+    monkeypatch.setattr("sauber.core.map_files", recording_map_files)
+
+    checker = FileHashChecker()
+    checker.iterate(tmp_path)
+
+    assert len(hashed_paths) == 2 * 3, "Two inodes in three stages"
+    assert set(checker.hard_links.name) == {"original", "link", "other", "other_link"}
+    assert set(checker.duplicate_files.name) == {"original", "link", "copy"}
+    assert checker.df.loc[tmp_path / "link", "hash"] == (
+        checker.df.loc[tmp_path / "original", "hash"]
+    )
+    assert checker.reclaimable_size == 10000, "Only the copy takes up extra space"
+
+
+def test_links_without_inodes(monkeypatch):
+    expected = FileHashChecker()
+    expected.iterate("test_data/files2/")
+
+    # Windows only reports inodes for a full stat, some filesystems never do
+    monkeypatch.setattr("sauber.utils.entry_identity", lambda entry: (0, 0, False))
+    checker = FileHashChecker()
+    checker.iterate("test_data/files2/")
+
+    assert checker.hard_links.empty
+    pandas.testing.assert_frame_equal(
+        checker.duplicate_files.drop(columns=["device", "inode"]),
+        expected.duplicate_files.drop(columns=["device", "inode"]),
+    )
+
+
+def test_verified_files_without_inodes(tmp_path, monkeypatch):
+    for folder, position in [("x", None), ("y", 50000)]:
+        content = bytearray(b"a" * 100000)
+        if position is not None:
+            content[position] = ord("b")
+        (tmp_path / folder).mkdir()
+        (tmp_path / folder / "f").write_bytes(content)
+
+    # Files that differ in the middle share their size, stage and tail hash
+    monkeypatch.setattr("sauber.utils.entry_identity", lambda entry: (0, 0, False))
+    checker = FileHashChecker(verify=True)
+    checker.iterate(tmp_path)
+
+    assert checker.duplicates.empty
+
+def test_symbolic_links_are_not_hard_links(tmp_path):
+    (tmp_path / "real").write_bytes(b"a" * 10000)
+    (tmp_path / "copy").write_bytes(b"a" * 10000)
+    (tmp_path / "alias").symlink_to(tmp_path / "real")
+    (tmp_path / "other").write_bytes(b"b" * 10000)
+
+    checker = FileHashChecker()
+    checker.iterate(tmp_path)
+
+    # Symbolic links take no space of their own, so they are no duplicates either
+    assert checker.hard_links.empty
+    assert checker.df.loc[tmp_path / "alias", "is_symlink"]
+    assert set(checker.duplicate_files.name) == {"real", "copy"}
+    assert checker.reclaimable_size == 10000
+    assert list(checker.iter_duplicate_groups(tmp_path)) == [
+        [tmp_path / "copy", tmp_path / "real"]
+    ]
+
+
+def test_iterate_roots(tmp_path):
+    for root in ["a", "b"]:
+        (tmp_path / root / "sub").mkdir(parents=True)
+        (tmp_path / root / "sub" / "same").write_bytes(b"a" * 10000)
+        (tmp_path / root / f"{root}_unique").write_bytes(root.encode() * 20000)
+    (tmp_path / "b" / "other").write_bytes(b"b" * 10000)
+
+    combined = FileHashChecker()
+    combined.iterate(tmp_path)
+
+    roots = FileHashChecker()
+    roots.iterate_roots([tmp_path / "a", tmp_path / "b"], jobs=2)
+
+    assert set(roots.duplicates.index) == {
+        tmp_path / "a" / "sub",
+        tmp_path / "a" / "sub" / "same",
+        tmp_path / "b" / "sub",
+        tmp_path / "b" / "sub" / "same",
+    }
+    columns = ["hash", "hash_stage", "size", "is_duplicate"]
+    pandas.testing.assert_frame_equal(
+        roots.df[columns], combined.df.loc[roots.df.index, columns]
+    )
+
+
+def test_collapsed_duplicates(tmp_path):
+    for root in ["a", "b"]:
+        (tmp_path / root / "sub").mkdir(parents=True)
+        (tmp_path / root / "sub" / "same").write_bytes(b"a" * 10000)
+        (tmp_path / root / "same").write_bytes(b"b" * 10000)
+    (tmp_path / "c").mkdir()
+    (tmp_path / "c" / "loose").write_bytes(b"b" * 10000)
+    (tmp_path / "c" / "unique").write_bytes(b"c" * 20000)
+    (tmp_path / "d").mkdir()
+    (tmp_path / "d" / "nested").write_bytes(b"a" * 10000)
+    (tmp_path / "d" / "unique").write_bytes(b"d" * 20000)
+
+    checker = FileHashChecker()
+    checker.iterate(tmp_path)
+
+    assert len(checker.duplicates) == 10
+    assert set(checker.collapsed_duplicates.index) == {
+        tmp_path / "a",
+        tmp_path / "b",
+        tmp_path / "a" / "same",
+        tmp_path / "b" / "same",
+        tmp_path / "c" / "loose",
+        tmp_path / "a" / "sub" / "same",
+        tmp_path / "b" / "sub" / "same",
+        tmp_path / "d" / "nested",
+    }
+    assert checker.query("duplicate_directories", collapse=True)["path"] == [
+        tmp_path / "b",
+        tmp_path / "a",
+    ]
+
+
+def test_merge_exported_partial(tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    (tmp_path / "a" / "one").write_bytes(b"a" * 10000)
+    (tmp_path / "b" / "two").write_bytes(b"a" * 10000)
+
+    partial = FileHashChecker()
+    partial.iterate(tmp_path / "a")
+    partial.export_data(tmp_path / "a.sauber")
+    assert partial.df.hash_stage.tolist() == [HASH_STAGE_NONE]
+
+    checker = FileHashChecker()
+    checker.iterate(tmp_path / "b")
+    checker.merge([tmp_path / "a.sauber"])
+
+    assert set(checker.duplicate_files.name) == {"one", "two"}
+
+
+def test_merge_snapshot_of_missing_files(tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    for path in ["a/x", "a/x2", "b/x"]:
+        (tmp_path / path).write_bytes(b"a" * 10000)
+    (tmp_path / "a" / "y").write_bytes(b"b" * 10000)
+
+    partial = FileHashChecker()
+    partial.iterate(tmp_path / "a")
+    partial.export_data(tmp_path / "a.sauber")
+    (tmp_path / "a").rename(tmp_path / "moved")
+
+    # Files of another host are compared by the hashes in their snapshot
+    checker = FileHashChecker()
+    checker.iterate(tmp_path / "b")
+    checker.merge([tmp_path / "a.sauber"])
+
+    assert len(checker.files) == 4
+    assert set(checker.duplicate_files.index) == {
+        tmp_path / "a" / "x",
+        tmp_path / "a" / "x2",
+        tmp_path / "b" / "x",
+    }
+    assert checker.stats.counters["unreadable_files"] == 0
+
+    # Older snapshots only know the full hash, which is never downgraded
+    metadata = json.loads((tmp_path / "a.sauber" / "metadata.json").read_text())
+    metadata["columns"] = [
+        name for name in metadata["columns"] if not name.startswith(("head", "tail"))
+    ]
+    (tmp_path / "a.sauber" / "metadata.json").write_text(json.dumps(metadata))
+
+    checker = FileHashChecker()
+    checker.iterate(tmp_path / "b")
+    checker.merge([tmp_path / "a.sauber"])
+
+    assert set(checker.duplicate_files.index) == {
+        tmp_path / "a" / "x",
+        tmp_path / "a" / "x2",
+        tmp_path / "b" / "x",
+    }
+
+
+
+def test_overlapping_roots(tmp_path):
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "one").write_bytes(b"a" * 10000)
+    (tmp_path / "two").write_bytes(b"a" * 10000)
+
+    checker = FileHashChecker()
+    groups = list(checker.iter_duplicate_groups([tmp_path / "sub", tmp_path]))
+    assert groups == [[tmp_path / "sub" / "one", tmp_path / "two"]]
+
+    checker.iterate_roots([tmp_path, tmp_path / "sub", tmp_path])
+    assert set(checker.duplicate_files.index) == set(groups[0])
+
+
+def test_engine_without_pandas():
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys\n"
+            "from sauber.core import FileHashChecker\n"
+            "checker = FileHashChecker()\n"
+            "checker.iterate('test_data/files2/')\n"
+            "print(len(checker.query('duplicate_directories')), checker.reclaimable_size)\n"
+            "print('pandas' in sys.modules)",
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+
+    assert result.stdout.splitlines() == ["3 22", "False"]
@@ -0,0 +1,31 @@
+import pathlib
+
+from sauber.entries import COLUMNS, Entries
+
+
+def make_entries(paths, digest):
+    return Entries(
+        {
+            "path": [pathlib.Path(path) for path in paths],
+            "hash": [digest] * len(paths),
+            "is_file": [True] * len(paths),
+        }
+    )
+
+
+def test_defaults():
+    entries = make_entries(["a", "b"], "x")
+
+    assert len(entries) == 2
+    assert set(entries.columns) == set(COLUMNS)
+    assert entries["is_duplicate"] == [False, False]
+    assert entries["size"] == [None, None]
+    assert entries.rows("is_file") == [0, 1]
+
+
+def test_merge():
+    merged = make_entries(["a", "b"], "old").merge(make_entries(["b", "c"], "new"))
+
+    assert merged["path"] == [pathlib.Path("a"), pathlib.Path("b"), pathlib.Path("c")]
+    assert merged.get(pathlib.Path("b"), "hash") == "new"
+    assert merged.take([0])["hash"] == ["old"]
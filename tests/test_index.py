@@ -0,0 +1,53 @@
+import numpy
+import pandas
+import pytest
+
+from sauber.core import FileHashChecker
+from sauber.index import CompactIndex
+
+
+def test_round_trip():
+    checker = FileHashChecker()
+    checker.iterate("test_data/files/")
+    index = checker.compact()
+
+    assert len(index) == len(checker.df)
+    assert index.columns["digest"].dtype.itemsize == 16
+    assert index.columns["size"].dtype == "int64"
+    assert index.columns["is_duplicate"].dtype == bool
+    assert len(index.directories) < len(index), "Parent directories are interned"
+
+    restored = index.to_dataframe()
+    pandas.testing.assert_frame_equal(
+        restored, checker.df[restored.columns], check_dtype=False
+    )
+
+
+@pytest.mark.parametrize("path", ["test_data/files2/", "test_data/files/"])
+def test_memory_usage(path):
+    checker = FileHashChecker()
+    checker.iterate(path)
+    index = checker.compact()
+
+    assert checker.df.memory_usage(deep=True).sum() >= 5 * index.nbytes
+
+
+def test_empty():
+    index = CompactIndex.from_dataframe(FileHashChecker().df)
+
+    assert len(index) == 0
+    assert index.to_dataframe().empty
+
+
+def test_save_load(tmp_path):
+    checker = FileHashChecker()
+    checker.iterate("test_data/files/")
+    checker.compact().save(tmp_path / "snapshot")
+
+    for mmap in [False, True]:
+        index = CompactIndex.load(tmp_path / "snapshot", mmap=mmap)
+        assert index.hash_algorithm == checker.hash_algorithm
+        assert isinstance(index.columns["size"], numpy.memmap) == mmap
+        pandas.testing.assert_frame_equal(
+            index.to_dataframe(), checker.compact().to_dataframe()
+        )
@@ -0,0 +1,83 @@
+import json
+import pstats
+import subprocess
+import sys
+
+
+def test_help_does_not_import_pandas():
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import runpy, sys\n"
+            "sys.argv = ['sauber', '--help']\n"
+            "try:\n"
+            "    runpy.run_module('sauber', run_name='__main__')\n"
+            "except SystemExit:\n"
+            "    pass\n"
+            "print('pandas' in sys.modules, 'numpy' in sys.modules)",
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+
+    assert result.stdout.splitlines()[-1] == "False False"
+
+
+def test_invalid_buffer_size():
+    result = subprocess.run(
+        [sys.executable, "-m", "sauber", "--buffer-size", "0", "test_data"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+
+    assert result.returncode == 2
+    assert "--buffer-size: 0 is not a positive number" in result.stderr
+
+
+def test_invalid_jobs():
+    result = subprocess.run(
+        [sys.executable, "-m", "sauber", "--jobs", "-2", "test_data"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+
+    assert result.returncode == 2
+    assert "--jobs: -2 is not a positive number" in result.stderr
+
+
+def test_json_stats():
+    result = subprocess.run(
+        [sys.executable, "-m", "sauber", "--no-cache", "--stats", "json", "test_data"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+
+    assert "hash_head" in json.loads(result.stderr)["phases"]
+    assert '"phases"' not in result.stdout
+
+
+def test_profile_worker_threads(tmp_path):
+    subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "sauber",
+            "--no-cache",
+            "--jobs",
+            "4",
+            "--profile",
+            str(tmp_path / "profile"),
+            "test_data/files",
+        ],
+        stdout=subprocess.PIPE,
+        check=True,
+    )
+
+    functions = {name for _, _, name in pstats.Stats(str(tmp_path / "profile")).stats}
+    assert "hash_file_full" in functions
@@ -0,0 +1,86 @@
+import random
+
+import pytest
+
+from sauber.core import FileHashChecker
+from sauber.minhash import (
+    element_value,
+    jaccard_similarity,
+    lsh_candidates,
+    lsh_rows,
+    minhash_permutations,
+    minhash_signature,
+)
+
+
+def test_minhash_signature():
+    random.seed(0)
+    first = set(random.sample(range(100000), 2000))
+    second = set(random.sample(sorted(first), 1500)) | set(range(100000, 100500))
+    permutations = minhash_permutations(512)
+
+    signatures = [
+        minhash_signature([element_value(value) for value in values], permutations)
+        for values in [first, second]
+    ]
+    estimate = (signatures[0] == signatures[1]).mean()
+
+    assert jaccard_similarity(first, second) == pytest.approx(0.6)
+    assert estimate == pytest.approx(0.6, abs=0.07)
+
+
+@pytest.mark.parametrize("threshold", [0.3, 0.5, 0.8, 0.95])
+def test_lsh_rows(threshold):
+    rows = lsh_rows(threshold, 128, recall=0.95)
+    bands = 128 // rows
+
+    assert 1 - (1 - threshold ** rows) ** bands >= 0.95
+    assert 1 - (1 - threshold ** (rows + 1)) ** (128 // (rows + 1)) < 0.95
+
+
+def test_lsh_candidates():
+    permutations = minhash_permutations()
+    sets = {
+        "a": set(range(100)),
+        "b": set(range(5, 100)),
+        "c": set(range(1000, 1100)),
+    }
+    signatures = {
+        name: minhash_signature(
+            [element_value(value) for value in values], permutations
+        )
+        for name, values in sets.items()
+    }
+
+    assert lsh_candidates(signatures, 0.8) == {("a", "b")}
+    assert lsh_candidates({}, 0.8) == set()
+
+
+def test_similar_directories(tmp_path):
+    for name in ["first", "second", "other"]:
+        (tmp_path / "root" / name).mkdir(parents=True)
+
+    for number in range(20):
+        content = f"file {number} ".encode() * (number + 1)
+        (tmp_path / "root" / "first" / f"{number}.txt").write_bytes(content)
+        if number > 0:
+            (tmp_path / "root" / "second" / f"copy {number}.txt").write_bytes(content)
+        (tmp_path / "root" / "other" / f"{number}.txt").write_bytes(
+            f"other {number} ".encode() * 100
+        )
+    (tmp_path / "root" / "second" / "new.txt").write_bytes(b"new" * 1000)
+
+    checker = FileHashChecker()
+    checker.iterate(tmp_path)
+
+    overlap = sum(len(f"file {number} ") * (number + 1) for number in range(1, 20))
+    assert checker.duplicate_directories.empty
+    assert checker.similar_directories() == [
+        (
+            tmp_path / "root" / "first",
+            tmp_path / "root" / "second",
+            pytest.approx(19 / 21),
+            overlap,
+        )
+    ]
+    assert checker.similar_directories(threshold=0.95) == []
@@ -0,0 +1,35 @@
+import io
+
+from sauber.core import FileHashChecker
+from sauber.progress import Progress, format_duration, format_size
+
+
+def test_progress_log_lines():
+    stream = io.StringIO()
+    progress = Progress(stream, interval=0.01)
+
+    progress.start("Hashing", 2, 2048)
+    progress.advance(1, 1024)
+    progress.finish()
+
+    assert stream.getvalue().splitlines()[-1].startswith(
+        "Hashing: 1/2 files, 1.0 KB/2.0 KB"
+    )
+    assert "\r" not in stream.getvalue(), "Not a terminal"
+
+
+def test_iterate_with_progress():
+    stream = io.StringIO()
+    checker = FileHashChecker(progress=Progress(stream))
+    checker.iterate("test_data/files/", jobs=2)
+
+    lines = stream.getvalue().splitlines()
+    assert lines[-1].startswith("Hashing md5:full: 11/11 files")
+    assert lines[-1].endswith("ETA 0s")
+
+
+def test_formatting():
+    assert format_size(512) == "512.0 B"
+    assert format_size(3 * 1024**3) == "3.0 GB"
+    assert format_duration(59) == "59s"
+    assert format_duration(3725) == "1h02m"
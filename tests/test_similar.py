@@ -0,0 +1,82 @@
+import itertools
+import pathlib
+import random
+
+import pytest
+
+from sauber.core import FileHashChecker
+from sauber.similar import (
+    binomial,
+    hamming_distance,
+    image_hash,
+    similar_groups,
+    similar_pairs,
+)
+
+
+def test_similar_pairs():
+    random.seed(0)
+    values = [random.getrandbits(64) for _ in range(300)]
+    values += [value ^ (1 << row % 64) ^ 1 for row, value in enumerate(values)]
+    values += values[:10] + [values[0] ^ (1 << 63)]
+
+    for threshold in [0, 2, 10, 16]:
+        expected = [
+            [first, second]
+            for first, second in itertools.combinations(range(len(values)), 2)
+            if hamming_distance(values[first], values[second]) <= threshold
+        ]
+        assert similar_pairs(values, threshold).tolist() == expected
+
+
+def test_similar_groups():
+    hashes = {"a": "ff00", "b": "ff01", "c": "ff03", "d": "00ff", "e": "0000"}
+
+    assert similar_groups({}, 10) == []
+    assert similar_groups(hashes, 0) == []
+    assert similar_groups(hashes, 1) == [["a", "b", "c"]]
+    assert similar_groups(hashes, 8) == [["a", "b", "c", "d", "e"]]
+
+
+def test_image_hash(tmp_path):
+    Image = pytest.importorskip("PIL.Image")
+    source = "test_data/files/base/jpeg/clouds.jpg"
+
+    with Image.open(source) as image:
+        image.resize((image.width // 3, image.height // 3)).save(tmp_path / "small.png")
+        image.save(tmp_path / "compressed.jpg", quality=20)
+    (tmp_path / "broken.jpg").write_bytes(b"not an image")
+
+    digests = [
+        int(image_hash(path), 16)
+        for path in [source, tmp_path / "small.png", tmp_path / "compressed.jpg"]
+    ]
+    for first, second in itertools.combinations(digests, 2):
+        assert hamming_distance(first, second) <= 4
+
+    other = int(image_hash("test_data/files/base/jpeg/asphalt.jpg"), 16)
+    assert hamming_distance(digests[0], other) > 10
+    assert image_hash(tmp_path / "broken.jpg") is None
+
+
+def test_similar_images(tmp_path):
+    Image = pytest.importorskip("PIL.Image")
+    with Image.open("test_data/files/base/jpeg/curved_road.jpg") as image:
+        image.resize((image.width // 2, image.height // 2)).save(tmp_path / "road.png")
+    with Image.open("test_data/files/base/jpeg/asphalt.jpg") as image:
+        image.save(tmp_path / "asphalt.jpg", quality=30)
+
+    base = pathlib.Path("test_data/files/base/jpeg")
+    checker = FileHashChecker()
+    checker.iterate_roots([tmp_path, base])
+
+    assert checker.similar_images() == [
+        [tmp_path / "asphalt.jpg", base / "asphalt.jpg"],
+        [tmp_path / "road.png", base / "curved_road.jpg"],
+    ]
+    assert checker.stats.phases["image_hash"]["files"] == 5
+
+
+def test_binomial():
+    assert [binomial(4, k) for k in range(6)] == [1, 4, 6, 4, 1, 0]
+    assert binomial(64, 10) == 151473214816
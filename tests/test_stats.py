@@ -0,0 +1,34 @@
+import json
+
+from sauber.cache import HashCache
+from sauber.core import FileHashChecker
+from sauber.stats import Stats
+
+
+def test_phases():
+    stats = Stats()
+    with stats.phase("read") as phase:
+        phase["files"] += 2
+        phase["bytes"] += 100
+    stats.add_phase("read", 1.0, files=1, bytes=50)
+
+    read = stats.as_dict()["phases"]["read"]
+    assert read["calls"] == 2
+    assert read["files"] == 3
+    assert read["bytes"] == 150
+    assert read["bytes_per_second"] > 0
+
+
+def test_iterate_stats(tmp_path):
+    with HashCache(tmp_path / "cache.sqlite") as cache:
+        FileHashChecker(cache=cache).iterate("test_data/files/")
+
+        checker = FileHashChecker(cache=cache)
+        checker.iterate("test_data/files/")
+
+    stats = json.loads(checker.stats.to_json())
+    for phase in ["walk", "hash_head", "add_files", "update_duplicates", "iterate"]:
+        assert phase in stats["phases"]
+
+    assert stats["phases"]["hash_full"]["files"] == 0, "Everything is cached"
+    assert stats["counters"]["reads_avoided"] > 0
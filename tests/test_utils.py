@@ -1,13 +1,23 @@
+import hashlib
+import os
 import pathlib
 
 import pytest
 
+from sauber.settings import COMPARE_CHUNK_SIZE
 from sauber.utils import (
+    available_hash_algorithms,
     extract_file_suffix,
+    files_equal,
     hash_file,
+    hash_file_ends,
+    hash_file_full,
     get_size,
     extract_parent,
     get_number_of_files_in_directory,
+    hash_text,
+    map_files,
+    scan_directory,
 )
 
 
@@ -68,3 +78,117 @@ def test_get_number_of_files_in_path():
     assert get_number_of_files_in_directory("test_data/files2/Subfolder/Empty") == 0
     with pytest.raises(NotADirectoryError):
         get_number_of_files_in_directory("test_data/files2/Subfolder/A/a1.txt")
+
+
+def test_hash_file_ends():
+    assert hash_file_ends("test_data/files/base/txt/lorem_ipsum_1000.txt") == (
+        hash_file_ends("test_data/files/duplicates/txt/lorem_ipsum_1000.txt")
+    )
+    assert hash_file_ends(
+        "test_data/files/base/pdf/document (original).pdf"
+    ) != hash_file_ends("test_data/files/duplicates/pdf/document (recreated).pdf")
+
+
+def test_hash_file_full():
+    assert (
+        hash_file_full("test_data/files/base/pdf/document (original).pdf")
+        == "d4b05fd59ed80b1805fa7b69769bb1b2"
+    )
+    assert hash_file_full("test_data/files/base/empty_file") == hash_file(
+        "test_data/files/base/empty_file"
+    )
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_map_files(executor):
+    paths = sorted(pathlib.Path("test_data/files2").rglob("*.txt"))
+    expected = [hash_file(path) for path in paths]
+
+    assert map_files(hash_file, paths, jobs=4, executor=executor) == expected
+    assert map_files(hash_file, [], jobs=4, executor=executor) == []
+
+
+def test_scan_directory():
+    columns = scan_directory("test_data/files2")
+    entries = dict(zip(columns["path"], zip(columns["is_file"], columns["size"])))
+
+    assert len(set(map(len, columns.values()))) == 1, "Columns have the same length"
+    assert pathlib.Path("test_data/files2") not in entries
+    assert entries[pathlib.Path("test_data/files2/Subfolder/random_file")] == (True, 6)
+    assert entries[pathlib.Path("test_data/files2/Subfolder/A")][0] is False
+    assert len(entries) == len(list(pathlib.Path("test_data/files2").rglob("*")))
+
+    index = columns["path"].index(pathlib.Path("test_data/files2/A/a1.txt"))
+    assert columns["name"][index] == "a1.txt"
+    assert columns["parent"][index] == pathlib.Path("test_data/files2/A")
+    assert columns["parent_name"][index] == "A"
+    assert columns["suffix"][index] == ".txt"
+    assert columns["is_dir"][index] is False
+    assert columns["inode"][index] == os.stat("test_data/files2/A/a1.txt").st_ino
+
+
+def test_hash_algorithms():
+    path = "test_data/files/base/txt/lorem_ipsum_1000.txt"
+    with open(path, "rb") as file:
+        content = file.read()
+
+    assert hash_file_full(path, algorithm="sha1") == hashlib.sha1(content).hexdigest()
+    assert (
+        hash_file_full(path, algorithm="blake2b")
+        == hashlib.blake2b(content).hexdigest()
+    )
+    assert hash_text("", algorithm="blake2s") == hashlib.blake2s().hexdigest()
+    assert set(available_hash_algorithms()) >= {"md5", "sha1", "blake2b", "blake2s"}
+
+    with pytest.raises(ValueError):
+        hash_file(path, algorithm="unknown")
+
+
+def test_xxhash_algorithms():
+    xxhash = pytest.importorskip("xxhash")
+    path = "test_data/files/base/txt/lorem_ipsum_1000.txt"
+    with open(path, "rb") as file:
+        content = file.read()
+
+    assert "xxh3_128" in available_hash_algorithms()
+    assert (
+        hash_file_full(path, algorithm="xxh3_128")
+        == xxhash.xxh3_128(content).hexdigest()
+    )
+
+
+@pytest.mark.parametrize("mmap_threshold", [None, 1])
+@pytest.mark.parametrize("buffer_size", [1, 1000, 1024 * 1024])
+def test_hash_file_full_io(buffer_size, mmap_threshold):
+    for path in [
+        "test_data/files/base/pdf/document (original).pdf",
+        "test_data/files/base/empty_file",
+    ]:
+        with open(path, "rb") as file:
+            expected = hashlib.md5(file.read()).hexdigest()
+
+        assert (
+            hash_file_full(path, buffer_size=buffer_size, mmap_threshold=mmap_threshold)
+            == expected
+        )
+
+
+def test_map_files_callback():
+    finished = []
+    results = map_files(str.upper, ["a", "b", "c"], jobs=2, callback=finished.append)
+
+    assert results == ["A", "B", "C"]
+    assert finished == ["A", "B", "C"]
+
+
+def test_files_equal(tmp_path):
+    content = b"a" * (3 * COMPARE_CHUNK_SIZE)
+    (tmp_path / "one").write_bytes(content)
+    (tmp_path / "two").write_bytes(content)
+    (tmp_path / "late").write_bytes(content[:-1] + b"b")
+    (tmp_path / "longer").write_bytes(content + b"a")
+
+    assert files_equal(tmp_path / "one", tmp_path / "two")
+    assert not files_equal(tmp_path / "one", tmp_path / "late")
+    assert not files_equal(tmp_path / "one", tmp_path / "longer")
+    assert not files_equal(tmp_path / "longer", tmp_path / "one")
@@ -0,0 +1,131 @@
+import pandas
+import pytest
+
+from sauber.core import FileHashChecker
+from sauber.settings import CHUNK_SIZE, HASH_STAGE_VERIFIED
+from sauber.utils import hash_file_full
+from sauber.verify import verify_group, verify_groups
+
+
+def create_candidates(tmp_path):
+    # All files share their size, head and tail, only some of them share the rest
+    content = bytearray(b"a" * 100000)
+    for name, position in [("one", None), ("two", None), ("late", 90000)]:
+        data = bytearray(content)
+        if position is not None:
+            data[position] = ord("b")
+        (tmp_path / name).write_bytes(data)
+
+    content[10000] = ord("b")
+    (tmp_path / "early").write_bytes(content)
+    (tmp_path / "early_copy").write_bytes(content)
+    content[20000] = ord("c")
+    (tmp_path / "unique").write_bytes(content)
+
+
+def test_verify_group(tmp_path):
+    create_candidates(tmp_path)
+    paths = sorted(tmp_path.iterdir())
+
+    confirmed, bytes_read = verify_group(paths, buffer_size=CHUNK_SIZE)
+
+    assert sorted(confirmed) == [
+        (
+            [tmp_path / "early", tmp_path / "early_copy"],
+            hash_file_full(tmp_path / "early"),
+        ),
+        ([tmp_path / "one", tmp_path / "two"], hash_file_full(tmp_path / "one")),
+    ]
+    assert bytes_read < 100000 * len(paths)
+
+
+def test_verify_group_exits_early(tmp_path):
+    (tmp_path / "one").write_bytes(b"a" * 1000000)
+    (tmp_path / "two").write_bytes(b"b" + b"a" * 999999)
+
+    confirmed, bytes_read = verify_group([tmp_path / "one", tmp_path / "two"])
+
+    assert confirmed == []
+    assert bytes_read == 2 * CHUNK_SIZE
+
+
+@pytest.mark.parametrize("max_open_files", [2, 256])
+def test_verify_groups_open_files(tmp_path, max_open_files):
+    paths = []
+    for number in range(10):
+        paths.append(tmp_path / str(number))
+        paths[-1].write_bytes(b"a" * 50000 + bytes([number % 3]))
+
+    phase = {}
+    confirmed = verify_groups(
+        [paths], jobs=2, max_open_files=max_open_files, phase=phase
+    )
+
+    assert sorted(group for group, _ in confirmed) == [
+        [paths[0], paths[3], paths[6], paths[9]],
+        [paths[1], paths[4], paths[7]],
+        [paths[2], paths[5], paths[8]],
+    ]
+    assert phase == {"files": 10, "bytes": 10 * 50001}
+
+
+@pytest.mark.parametrize("max_open_files", [2, 256])
+def test_verify_unreadable_files(tmp_path, max_open_files):
+    for name in ["one", "two"]:
+        (tmp_path / name).write_bytes(b"a" * 10000)
+    paths = [tmp_path / "missing", tmp_path / "one", tmp_path / "two"]
+
+    confirmed, _ = verify_group(paths, max_open_files=max_open_files)
+    assert [group for group, _ in confirmed] == [paths[1:]]
+
+    confirmed, _ = verify_group(paths[:2], max_open_files=max_open_files)
+    assert confirmed == []
+
+
+def test_verify_same_duplicates(tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    create_candidates(tmp_path / "a")
+    create_candidates(tmp_path / "b")
+    (tmp_path / "b" / "late").write_bytes(b"a" * 100000)
+
+    hashed = FileHashChecker()
+    hashed.iterate(tmp_path)
+    verified = FileHashChecker(verify=True)
+    verified.iterate(tmp_path)
+
+    pandas.testing.assert_frame_equal(hashed.duplicates, verified.duplicates)
+    assert verified.stats.phases["verify"]["files"] == 12
+    assert verified.stats.phases["hash_full"]["files"] == 0
+
+    # Differing files keep their tail hash, but never make directories equal
+    assert verified.df.loc[tmp_path / "a" / "late", "hash_stage"] == (
+        HASH_STAGE_VERIFIED
+    )
+    assert not verified.df.loc[tmp_path / "a", "is_duplicate"]
+
+    groups = list(verified.iter_duplicate_groups(tmp_path))
+    assert sorted(groups) == sorted(
+        sorted(group_df.index)
+        for _, group_df in hashed.duplicate_files.groupby(["size", "hash"])
+    )
+
+
+def test_verify_snapshot(tmp_path):
+    (tmp_path / "tree").mkdir()
+    create_candidates(tmp_path / "tree")
+
+    checker = FileHashChecker(verify=True)
+    checker.iterate(tmp_path / "tree")
+    checker.export_data(tmp_path / "data.sauber")
+
+    imported = FileHashChecker()
+    imported.import_data(tmp_path / "data.sauber")
+    pandas.testing.assert_frame_equal(imported.df, checker.df)
+
+    # All candidates keep their tail hash in the snapshot
+    incremental = FileHashChecker(verify=True)
+    incremental.iterate(tmp_path / "tree", baseline=imported)
+    pandas.testing.assert_frame_equal(incremental.duplicates, checker.duplicates)
+    assert incremental.stats.phases["hash_tail"]["baseline_hits"] == 6
+    assert incremental.stats.phases["hash_tail"]["files"] == 0